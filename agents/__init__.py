@@ -3,11 +3,13 @@ from .inventory_agent import InventoryAgent
 from .accounts_agent import AccountsAgent
 from .hr_agent import HRAgent
 from .management_agent import ManagementAgent
+from .registry import AgentRegistry
 
 __all__ = [
     "SalesAgent",
     "InventoryAgent",
     "AccountsAgent",
     "HRAgent",
-    "ManagementAgent"
+    "ManagementAgent",
+    "AgentRegistry"
 ]
\ No newline at end of file
@@ -10,7 +10,7 @@ from workflows.param_wrappers import tool_with_named_args
 from langchain_core.tools import Tool
 
 class AccountsAgent(BaseAgent):
-    def __init__(self, use_hnsw: bool = True):
+    def __init__(self, use_hnsw: bool = True, embedder: str = "together", tool_mode: str = "parallel"):
         tools = [
             Tool(
                 name="GetUnpaidInvoices",
@@ -46,4 +46,4 @@ class AccountsAgent(BaseAgent):
                 )
             ),
         ]
-        super().__init__("Accounts", tools, use_hnsw=use_hnsw)
\ No newline at end of file
+        super().__init__("Accounts", tools, use_hnsw=use_hnsw, embedder=embedder, tool_mode=tool_mode)
\ No newline at end of file
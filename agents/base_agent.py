@@ -2,32 +2,91 @@ import os
 import logging
 import time
 import asyncio
-import faiss
+import traceback
 from langchain.agents import initialize_agent, AgentType
-from langchain_openai import ChatOpenAI
+from workflows.llm_clients import get_llm
+from workflows.event_loop import aiter_with_timeout, iterate, run_coroutine
+from workflows.intent_router import get_intent_router
+from workflows.workflow_engine import execute_query
+from workflows.tool_planner import ParallelToolExecutor, executor_events
+from workflows.prompt_builder import PromptBuilder
+from workflows.tracing import span, trace
 from memory.context_manager import FAISSContextManager
+from memory.index_policy import IndexPolicy
+from memory.memory_service import SHARED_CONTEXT_PATH, get_memory_service, import_legacy_context
+from memory.response_cache import get_response_cache
+from mock_erp.operations import data_version
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 logging.basicConfig(format='%(asctime)s - %(message)s')
 
+class Turn:
+    """State of one query as it moves through BaseAgent's pipeline."""
+
+    def __init__(self, query):
+        self.query = query
+        self.vector = None
+        self.version = None
+        self.context_entries = []
+        self.prompt = None
+        self.response = None
+
+    def finish(self, path):
+        """The turn's "final" event; `path` names the stage that answered."""
+        return {"type": "final", "response": self.response, "context": self.context_entries, "path": path}
+
+
 class BaseAgent:
-    def __init__(self, department, tools, use_hnsw=True):
-        self.llm = ChatOpenAI(
-            openai_api_key=os.getenv("OPENAI_API_KEY"),
-            openai_api_base="https://api.together.xyz/v1",
-            model="meta-llama/Llama-3-70b-chat-hf",
-            temperature=0.3,
-            max_tokens=512,
-        )
+    def __init__(self, department, tools, use_hnsw=True, autosave=False, lazy_load=True, retention=None,
+                 index_policy=None, embedder="together", shared_memory=True, response_cache=True,
+                 intent_router=True, tool_mode="parallel", context_token_budget=600):
+        # Shared across agents: one client and connection pool per process
+        self.llm = get_llm("agent")
         self.department = department
         self.tools = tools
 
-        self.context_path = f"context_data/context_{department}"
+        # With shared_memory every agent and session uses one process-wide manager
+        # (departments are its partitions) configured by the first agent created,
+        # and later agents asking for other settings fail with ValueError;
+        # otherwise each agent has its own store, embedder and settings.
+        self.shared_memory = shared_memory
+        legacy_path = f"context_data/context_{department}"
+        self.context_path = SHARED_CONTEXT_PATH if shared_memory else legacy_path
         os.makedirs(os.path.dirname(self.context_path), exist_ok=True)
 
-        self.context_manager = FAISSContextManager(dim=768, use_hnsw=use_hnsw)
-        self._load_context()
+        create_manager = get_memory_service if shared_memory else FAISSContextManager
+        manager_kwargs = {"path": self.context_path} if shared_memory else {}
+        self.context_manager = create_manager(
+            **manager_kwargs,
+            dim=768,
+            use_hnsw=use_hnsw,
+            cache_dir="context_data/embedding_cache",
+            # Checkpoint each write-behind batch as a delta segment when autosave is on
+            checkpoint_path=self.context_path if autosave else None,
+            # Memory-map snapshot indexes and decode metadata only when retrieved
+            lazy_load=lazy_load,
+            # Optional memory.retention.RetentionPolicy (or per-department dict)
+            retention=retention,
+            # Flat -> HNSW -> IVF-PQ as history grows; use_hnsw=False keeps exact flat search
+            index_policy=index_policy or (IndexPolicy() if use_hnsw else None),
+            # "together" (remote API), "hashing" (local, offline) or an Embeddings instance
+            embedder=embedder
+        )
+        if shared_memory:
+            # The service loads its own snapshot; fold in this agent's pre-sharing store once
+            import_legacy_context(self.context_manager, legacy_path, self.context_path)
+        else:
+            self._load_context()
+
+        # Answers to repeated read-only questions, dropped on TTL or any ERP write
+        self.response_cache = get_response_cache(
+            self.context_manager.embedder, version_fn=data_version
+        ) if response_cache else None
+        # Retrieved context is ranked and trimmed to a fixed token budget per turn
+        self.prompt_builder = PromptBuilder(max_context_tokens=context_token_budget)
+        # Unambiguous read-only queries run their ERP operation without the LLM
+        self.intent_router = get_intent_router(self.context_manager.embedder) if intent_router else None
 
         try:
             # CRITICAL FIX: Use the correct agent type for multiple parameters
@@ -42,6 +101,13 @@ class BaseAgent:
                 return_intermediate_steps=False,
                 input_variables=["input", "agent_scratchpad"]
             )
+            if tool_mode == "parallel":
+                # Independent tool calls run concurrently; ReAct handles replies that are not plans
+                self.agent_executor = ParallelToolExecutor(
+                    self.llm, self.tools, department=department, fallback=self.agent_executor
+                )
+            elif tool_mode != "react":
+                raise ValueError(f"Unknown tool_mode '{tool_mode}'. Options: parallel, react")
             logger.info(f"✅ {department} agent initialized successfully")
         except Exception as e:
             logger.error(f"⚠️ Agent initialization failed: {str(e)}")
@@ -53,44 +119,158 @@ class BaseAgent:
                 logger.info(f"⚠️ No context found for {self.department}. Starting fresh.")
         except Exception as e:
             logger.error(f"Context loading failed: {str(e)}")
-            self.context_manager.index = faiss.IndexFlatL2(self.context_manager.dim)
+            self.context_manager.clear_memory()
+
+    def get_contexts(self, queries, k=2):
+        """Context for several queries from this department in one batched lookup."""
+        return self.context_manager.get_context_batch(queries, self.department, k=k)
+
+    def get_router_stats(self):
+        return self.intent_router.get_stats() if self.intent_router is not None else {}
 
     def get_context_stats(self):
-        return self.context_manager.get_context_stats()
+        return self.context_manager.get_context_stats(self.department)
+
+    def run(self, query, timeout=30):
+        """Blocking wrapper around arun() on the shared background event loop."""
+        return run_coroutine(self.arun(query, timeout=timeout))
+
+    async def arun(self, query, timeout=30):
+        """
+        Answer a query; returns (response, context_entries). Safe to await from
+        any event loop and to run concurrently for the same agent: per-turn state
+        is local, and blocking memory calls run in worker threads.
+        """
+        final = {"response": "⚠️ No response generated.", "context": []}
+        async for event in self.astream(query, timeout=timeout):
+            if event["type"] == "final":
+                final = event
+        return final["response"], final["context"]
+
+    def stream(self, query, timeout=30):
+        """Blocking iterator over astream() events, for synchronous front ends."""
+        return iterate(self.astream(query, timeout=timeout))
+
+    async def astream(self, query, timeout=30):
+        """
+        Answer a query as a stream of events: "token" (answer text as it is
+        generated; "reset" discards the tokens so far), "tool_start"/"tool_end"
+        around tool calls, then one "final" event with "response", "context"
+        and "path" (which stage answered).
+        Each call is traced as one request (see workflows.tracing).
+        """
+        with trace("agent.turn", department=self.department) as root:
+            async for event in self._turn_events(query, timeout):
+                if event["type"] == "final" and root is not None:
+                    root.set(path=event["path"])
+                yield event
 
-    def run(self, query):
+    async def _turn_events(self, query, timeout):
+        """
+        The turn pipeline every front end goes through: embed → response cache
+        → intent fast path → retrieve → build prompt → execute (streamed) →
+        store. Each stage runs at most once per turn and the query is embedded
+        once, with the vector reused by the cache, router and retrieval.
+        """
+        turn = Turn(query)
         if not self.agent_executor:
-            return "⚠️ Agent is not properly initialized", []
+            turn.response = "⚠️ Agent is not properly initialized"
+            yield turn.finish("error")
+            return
+        await self._embed(turn)
+        if self._lookup_cache(turn):
+            yield turn.finish("response_cache")
+            return
+        if await self._route(turn):
+            await self._store(turn)
+            yield turn.finish("intent_router")
+            return
+        await self._retrieve(turn)
+        self._build(turn)
+        async for event in self._execute(turn, timeout):
+            yield event
+        if not turn.response.startswith("⚠️"):
+            await self._store(turn)
+            self._store_cache(turn)
+        yield turn.finish("agent")
 
-        context_entries = self.context_manager.get_context(query, self.department, k=2)
+    async def _embed(self, turn):
+        # Without a cache or router, retrieval embeds the query itself (still once)
+        if self.response_cache is None and self.intent_router is None:
+            return
+        try:
+            turn.vector = await asyncio.to_thread(self.context_manager.embed_query, turn.query)
+        except Exception as e:
+            logger.error(f"⚠️ Query embedding failed: {str(e)}")
+
+    def _lookup_cache(self, turn):
+        if self.response_cache is None or turn.vector is None:
+            return False
+        turn.version = data_version()
+        with span("response_cache.lookup"):
+            cached = self.response_cache.lookup(self.department, turn.query, turn.vector)
+        if cached is None:
+            return False
+        logger.info(f"Response cache hit for: {turn.query}")
+        turn.response, turn.context_entries = cached
+        return True
+
+    async def _route(self, turn):
+        if self.intent_router is None:
+            return False
+        response = await asyncio.to_thread(
+            execute_query, turn.query, self.department, self.intent_router, turn.vector
+        )
+        # A failed operation falls through to the agent, which can ask for what is missing
+        if response is None or response.startswith("❌"):
+            return False
+        logger.info(f"Intent fast path answered: {turn.query}")
+        turn.response = response
+        return True
+
+    async def _retrieve(self, turn):
+        with span("memory.get_context"):
+            turn.context_entries = await asyncio.to_thread(
+                self.context_manager.get_context, turn.query, self.department, 2, turn.vector
+            )
+
+    def _build(self, turn):
+        with span("prompt.build"):
+            turn.prompt = self.build_prompt(turn.query, turn.context_entries)
+        logger.info(f"Agent input: {turn.prompt}")
+
+    async def _execute(self, turn, timeout):
+        """Run the executor, re-yielding its token/tool events; sets turn.response."""
         start_time = time.time()
         try:
-            context_str = self._format_context(context_entries)
-            full_query = f"{context_str}Current Question: {query}"
-            logger.info(f"Agent input: {full_query}")
-            result = asyncio.run(self._invoke_with_timeout(
-                {"input": full_query},
-                timeout=30
-            ))
-            response = result["output"]
+            with span("agent.executor"):
+                events = executor_events(self.agent_executor, {"input": turn.prompt})
+                async for event in aiter_with_timeout(events, timeout):
+                    if event["type"] == "output":
+                        turn.response = event["output"]
+                    else:
+                        yield event
+            if turn.response is None:
+                turn.response = "⚠️ Agent returned no output"
         except asyncio.TimeoutError:
-            response = "⚠️ Agent timed out. Please try a simpler query."
+            turn.response = "⚠️ Agent timed out. Please try a simpler query."
             logger.warning("Agent execution timed out")
         except Exception as e:
-            response = f"⚠️ Agent Error: {str(e)}"
+            turn.response = f"⚠️ Agent Error: {str(e)}"
             logger.error(f"Agent execution failed: {str(e)}")
             logger.error(traceback.format_exc())
         duration = time.time() - start_time
         logger.info(f"Agent response time: {duration:.2f}s")
-        if not response.startswith("⚠️"):
-            self.context_manager.store_interaction(query, response, self.department)
-        return response, context_entries
-
-    async def _invoke_with_timeout(self, input, timeout=30):
-        return await asyncio.wait_for(
-            self.agent_executor.ainvoke(input),
-            timeout=timeout
-        )
+
+    async def _store(self, turn):
+        with span("memory.store"):
+            await asyncio.to_thread(self.context_manager.store_interaction, turn.query, turn.response, self.department)
+
+    def _store_cache(self, turn):
+        if self.response_cache is not None and turn.vector is not None:
+            # Skipped if this turn (or another) changed ERP data meanwhile
+            self.response_cache.store(self.department, turn.query, turn.response, turn.context_entries,
+                                      vector=turn.vector, version=turn.version)
 
     def save_context(self):
         try:
@@ -100,12 +280,15 @@ class BaseAgent:
             return f"⚠️ Save failed: {str(e)}"
 
     def clear_context(self):
-        self.context_manager.clear_memory()
+        self.context_manager.clear_department(self.department)
+        if self.response_cache is not None:
+            self.response_cache.invalidate(self.department)
         return "🧹 Context cleared. All historical data removed."
 
-    def _format_context(self, context_entries):
-        context_str = ""
-        if context_entries:
-            for entry in context_entries:
-                context_str += f"Previous Q: {entry['query']}\nPrevious A: {entry['response']}\n\n"
-        return context_str
\ No newline at end of file
+    def build_prompt(self, query, context_entries):
+        """Agent input for a query, with its retrieved context fitted to the token budget."""
+        full_query, _ = self.prompt_builder.build(query, context_entries)
+        return full_query
+
+    def get_prompt_stats(self):
+        return self.prompt_builder.get_stats()
\ No newline at end of file
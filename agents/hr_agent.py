@@ -10,7 +10,7 @@ from workflows.param_wrappers import tool_with_named_args
 from langchain_core.tools import Tool
 
 class HRAgent(BaseAgent):
-    def __init__(self, use_hnsw: bool = True):
+    def __init__(self, use_hnsw: bool = True, embedder: str = "together", tool_mode: str = "parallel"):
         tools = [
             Tool(
                 name="GetLeaveCalendar",
@@ -38,4 +38,4 @@ class HRAgent(BaseAgent):
                 description="List employees, optionally filtering by joined_month (e.g. 'May', '2025-05', or '2025')."
             ),
         ]
-        super().__init__("HR", tools, use_hnsw=use_hnsw)
\ No newline at end of file
+        super().__init__("HR", tools, use_hnsw=use_hnsw, embedder=embedder, tool_mode=tool_mode)
\ No newline at end of file
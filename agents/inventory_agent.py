@@ -10,7 +10,7 @@ from workflows.param_wrappers import tool_with_named_args
 from langchain_core.tools import Tool
 
 class InventoryAgent(BaseAgent):
-    def __init__(self, use_hnsw: bool = True):
+    def __init__(self, use_hnsw: bool = True, embedder: str = "together", tool_mode: str = "parallel"):
         tools = [
             Tool(
                 name="GetStockLevels",
@@ -48,4 +48,4 @@ class InventoryAgent(BaseAgent):
                 description="Generate inventory valuation or movement report."
             )
         ]
-        super().__init__("Inventory", tools, use_hnsw=use_hnsw)
\ No newline at end of file
+        super().__init__("Inventory", tools, use_hnsw=use_hnsw, embedder=embedder, tool_mode=tool_mode)
\ No newline at end of file
@@ -9,7 +9,7 @@ from workflows.param_wrappers import tool_with_named_args
 from langchain_core.tools import Tool
 
 class ManagementAgent(BaseAgent):
-    def __init__(self, use_hnsw: bool = True):
+    def __init__(self, use_hnsw: bool = True, embedder: str = "together", tool_mode: str = "parallel"):
         tools = [
             Tool(
                 name="GetSalesPerformance",
@@ -32,4 +32,4 @@ class ManagementAgent(BaseAgent):
                 description="Generate strategic reports with insights."
             ),
         ]
-        super().__init__("Management", tools, use_hnsw=use_hnsw)
\ No newline at end of file
+        super().__init__("Management", tools, use_hnsw=use_hnsw, embedder=embedder, tool_mode=tool_mode)
\ No newline at end of file
@@ -0,0 +1,79 @@
+import logging
+import threading
+import time
+
+from .sales_agent import SalesAgent
+from .inventory_agent import InventoryAgent
+from .accounts_agent import AccountsAgent
+from .hr_agent import HRAgent
+from .management_agent import ManagementAgent
+
+logger = logging.getLogger(__name__)
+
+AGENT_CLASSES = {
+    "Sales": SalesAgent,
+    "Inventory": InventoryAgent,
+    "Accounts": AccountsAgent,
+    "HR": HRAgent,
+    "Management": ManagementAgent,
+}
+
+
+class AgentRegistry:
+    """
+    Department agents built on first access instead of all up front. prewarm()
+    builds the others in a background thread; a department requested while it
+    is being prewarmed waits for that build rather than starting a second one.
+    `init_times` holds each agent's construction time in seconds.
+    """
+
+    def __init__(self, agent_classes: dict = None, **agent_kwargs):
+        self.agent_classes = dict(agent_classes or AGENT_CLASSES)
+        self.agent_kwargs = agent_kwargs
+        self.init_times = {}
+        self._agents = {}
+        self._locks = {department: threading.Lock() for department in self.agent_classes}
+        self._prewarm_thread = None
+
+    def __getitem__(self, department: str):
+        return self.get(department)
+
+    def __contains__(self, department: str) -> bool:
+        return department in self.agent_classes
+
+    def get(self, department: str):
+        agent = self._agents.get(department)
+        if agent is not None:
+            return agent
+        if department not in self.agent_classes:
+            raise KeyError(f"Unknown department '{department}'. Options: {', '.join(self.agent_classes)}")
+        with self._locks[department]:
+            agent = self._agents.get(department)
+            if agent is None:
+                start = time.perf_counter()
+                agent = self.agent_classes[department](**self.agent_kwargs)
+                self.init_times[department] = time.perf_counter() - start
+                self._agents[department] = agent
+                logger.info(f"⏱️ {department} agent built in {self.init_times[department]:.2f}s")
+        return agent
+
+    def is_ready(self, department: str) -> bool:
+        return department in self._agents
+
+    def prewarm(self, departments: list = None, exclude: tuple = ()):
+        """Build the given (default: all) departments in a daemon thread; returns the thread."""
+        if self._prewarm_thread is not None and self._prewarm_thread.is_alive():
+            return self._prewarm_thread
+        pending = [department for department in (departments or self.agent_classes)
+                   if department not in exclude and not self.is_ready(department)]
+
+        def build_all():
+            for department in pending:
+                try:
+                    self.get(department)
+                except Exception as e:
+                    logger.error(f"⚠️ Prewarming {department} agent failed: {str(e)}")
+
+        self._prewarm_thread = threading.Thread(target=build_all, daemon=True)
+        self._prewarm_thread.start()
+        return self._prewarm_thread
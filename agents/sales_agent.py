@@ -4,7 +4,7 @@ from workflows.param_wrappers import tool_with_named_args
 from langchain_core.tools import Tool
 
 class SalesAgent(BaseAgent):
-    def __init__(self, use_hnsw: bool = True):
+    def __init__(self, use_hnsw: bool = True, embedder: str = "together", tool_mode: str = "parallel"):
         tools = [
             Tool(
                 name="GetSalesData",
@@ -22,4 +22,4 @@ class SalesAgent(BaseAgent):
                 description="Create a new sales lead given company and contact."
             ),
         ]
-        super().__init__("Sales", tools, use_hnsw=use_hnsw)
\ No newline at end of file
+        super().__init__("Sales", tools, use_hnsw=use_hnsw, embedder=embedder, tool_mode=tool_mode)
\ No newline at end of file
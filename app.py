@@ -1,13 +1,14 @@
 from dotenv import load_dotenv
 load_dotenv()
 import streamlit as st
-from agents import SalesAgent, InventoryAgent, AccountsAgent, HRAgent, ManagementAgent
+from agents import AgentRegistry
 from analytics.dashboard import show_analytics_dashboard, get_analytics_df
 import time
 import pandas as pd
 import os
 
-from workflows.display_utils import display_agent_result
+from workflows.display_utils import display_agent_result, display_trace_waterfall
+from workflows.tracing import get_ring_buffer, span, trace
 
 st.set_page_config(
     page_title="ERPNext AI Assistant",
@@ -86,14 +87,15 @@ if "onboarded" not in st.session_state:
     st.session_state.onboarded = True
 
 # ---- Initialize Agents ----
+# Agents are built when their department is first selected; the rest are
+# prewarmed in the background once the selected one is ready.
 if "agents" not in st.session_state:
-    st.session_state.agents = {
-        "Sales": SalesAgent(),
-        "Inventory": InventoryAgent(),
-        "Accounts": AccountsAgent(),
-        "HR": HRAgent(),
-        "Management": ManagementAgent()
-    }
+    # AGENT_TOOL_MODE=react switches back to LangChain's one-tool-per-step executor
+    st.session_state.agents = AgentRegistry(tool_mode=os.getenv("AGENT_TOOL_MODE", "parallel"))
+if not st.session_state.agents.is_ready(department):
+    with st.spinner(f"Starting {department_options[department]} assistant..."):
+        st.session_state.agents[department]
+st.session_state.agents.prewarm(exclude=(department,))
 
 # ---- Chat and Context ----
 st.session_state.setdefault("messages", {})
@@ -138,6 +140,15 @@ with st.sidebar:
     agent = st.session_state.agents[department]
     stats = agent.get_context_stats()
     st.caption(f"🧠 Memory: {stats['entries']} entries, {stats['vectors']} vectors")
+    init_time = st.session_state.agents.init_times.get(department)
+    if init_time is not None:
+        st.caption(f"⏱️ Agent started in {init_time:.2f}s")
+    cache_stats = stats.get("embedding_cache") or {}
+    if cache_stats:
+        st.caption(
+            f"⚡ Embedding cache: {cache_stats['hit_rate']:.0%} hit rate, "
+            f"{(cache_stats['memory_bytes'] + cache_stats['disk_bytes']) / 1e6:.1f} MB"
+        )
 
     col1, col2 = st.columns(2)
     with col1:
@@ -162,14 +173,28 @@ with st.sidebar:
             st.info("No context used yet")
 
         if st.button("View All Context Entries"):
-            all_entries = agent.context_manager.context_data
-            if all_entries:
-                df = pd.DataFrame(all_entries)[['timestamp', 'department', 'query']]
+            context_table = agent.context_manager.context_data
+            if len(context_table):
+                df = pd.DataFrame(context_table.to_columns(['timestamp', 'department', 'query']))
+                # Memory is shared across agents; show this department's entries
+                df = df[df['department'] == department]
                 df['timestamp'] = pd.to_datetime(df['timestamp'], unit='s')
                 st.dataframe(df.sort_values('timestamp', ascending=False))
             else:
                 st.warning("No context entries stored")
 
+    with st.expander("⏱️ Request Traces"):
+        traces = get_ring_buffer().traces(limit=10)
+        if traces:
+            for request in traces:
+                st.caption(
+                    f"`{request['request_id']}` {request['name']} · {request['duration_ms']:.0f} ms · "
+                    f"{time.strftime('%H:%M:%S', time.localtime(request['started_at']))}"
+                )
+                display_trace_waterfall(request)
+        else:
+            st.info("No requests traced yet")
+
 # ---- Chat input ----
 chat_input_key = f"chat_input_{department}_{st.session_state.input_key_counter}"
 prompt = st.chat_input(
@@ -182,59 +207,47 @@ if prompt:
     st.session_state.messages[department].append({"role": "user", "content": prompt})
     st.chat_message("user").markdown(f"🗣️ {prompt}")
 
-    with st.chat_message("assistant"):
-        message_placeholder = st.empty()
-        full_response = ""
-        last_observation = None  # For fallback
-
-        # Retrieve context
-        context_entries = agent.context_manager.get_context(
-            prompt, department, k=2
-        )
-
-        # Format context as string
-        context_str = "\n\n".join(
-            f"Previous Q: {entry['query']}\nPrevious A: {entry['response']}"
-            for entry in context_entries
-        )
-
-        # Combine with current query
-        full_query = f"{context_str}\nCurrent Question: {prompt}"
-
-        with st.spinner("🔍 Analyzing your query..."):
-            try:
-                for chunk in agent.agent_executor.stream({"input": full_query}):
-                    if "output" in chunk:
-                        token = chunk["output"]
-                        full_response += token
-                        message_placeholder.markdown(f"🤖 {full_response}▌")
-                    if "observation" in chunk:
-                        last_observation = chunk["observation"]
-                message_placeholder.empty()
-                # Prefer full_response if available, otherwise use last_observation
-                if full_response and full_response.strip():
-                    display_agent_result(full_response)
-                elif last_observation:
-                    display_agent_result(last_observation)
-                else:
-                    st.warning("No response generated.")
-                st.session_state.context_history[department].append(context_entries)
-                st.toast("✅ Response generated!", icon="✅")
-            except Exception as e:
-                error = f"⚠️ System Error: {str(e)}"
-                message_placeholder.markdown(f"🤖 {error}")
-                full_response = error
-                st.toast(error, icon="⚠️")
-
-    st.session_state.messages[department].append({
-        "role": "assistant", 
-        "content": full_response if full_response else (last_observation or "")
-    })
-
-    if not (full_response and full_response.startswith("⚠️")):
-        agent.context_manager.store_interaction(
-            prompt, full_response if full_response else (last_observation or ""), department
-        )
+    # Traced as one request; see the Request Traces panel in the sidebar
+    with trace("app.turn", department=department):
+        with st.chat_message("assistant"):
+            message_placeholder = st.empty()
+            full_response = ""
+            tool_lines = []
+
+            with st.spinner("🔍 Analyzing your query..."):
+                try:
+                    # The agent retrieves context, answers and stores the turn;
+                    # tokens and tool calls are shown as they happen
+                    for event in agent.stream(prompt):
+                        if event["type"] == "token":
+                            full_response += event["text"]
+                        elif event["type"] == "reset":
+                            full_response = ""
+                        elif event["type"] == "tool_start":
+                            tool_lines.append(f"🔧 `{event['tool']}` running...")
+                        elif event["type"] == "tool_end":
+                            tool_lines.append(f"✔️ `{event['tool']}` done")
+                        elif event["type"] == "final":
+                            full_response = event["response"]
+                            st.session_state.context_history[department].append(event["context"])
+                        message_placeholder.markdown("\n\n".join(tool_lines[-4:] + [f"🤖 {full_response}▌"]))
+                    message_placeholder.empty()
+                    with span("display"):
+                        if full_response and full_response.strip():
+                            display_agent_result(full_response)
+                        else:
+                            st.warning("No response generated.")
+                    st.toast("✅ Response generated!", icon="✅")
+                except Exception as e:
+                    error = f"⚠️ System Error: {str(e)}"
+                    message_placeholder.markdown(f"🤖 {error}")
+                    full_response = error
+                    st.toast(error, icon="⚠️")
+
+        st.session_state.messages[department].append({
+            "role": "assistant",
+            "content": full_response
+        })
 
     st.session_state.input_key_counter += 1
     st.rerun()
\ No newline at end of file
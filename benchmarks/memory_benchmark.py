@@ -0,0 +1,205 @@
+"""
+Offline benchmark for FAISSContextManager.
+
+Builds synthetic interaction histories across the five departments and, for
+each index mode and history size, measures store throughput, get_context
+latency, recall@k against an exact IndexFlatL2 search, memory footprint and
+save/load times. Uses the local hashing embedder, so no API key or network
+is needed. Results are printed as JSON lines (one object per run):
+
+    python -m benchmarks.memory_benchmark --sizes 1000 10000 --modes flat hnsw
+    python -m benchmarks.memory_benchmark --sizes 1000000 --output results.jsonl
+"""
+import argparse
+import contextlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import faiss
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from memory.context_manager import FAISSContextManager
+from memory.embedders import HashingEmbeddings
+from memory.index_policy import IndexPolicy
+
+DEPARTMENTS = ["Sales", "Inventory", "Accounts", "HR", "Management"]
+
+TEMPLATES = {
+    "Sales": ("Show sales summary for {period} in {region}",
+              "Sales for {period} in {region} were ₹{amount} across {count} orders"),
+    "Inventory": ("What is the stock level of ITEM-{item} in {warehouse}",
+                  "ITEM-{item} has {count} units in the {warehouse} warehouse"),
+    "Accounts": ("List unpaid invoices for customer CUST-{item} from {period}",
+                 "Customer CUST-{item} has {count} unpaid invoices totalling ₹{amount}"),
+    "HR": ("How many leave days does EMP-{item} have left in {period}",
+           "EMP-{item} has {count} leave days remaining for {period}"),
+    "Management": ("Give me the {region} KPI dashboard for {period}",
+                   "{region} revenue for {period} is ₹{amount} with {count} active projects"),
+}
+PERIODS = ["this week", "last week", "this month", "last month", "Q1", "Q2", "Q3", "Q4", "this year"]
+REGIONS = ["North", "South", "East", "West", "Central", "Export"]
+WAREHOUSES = ["Main", "Stores", "Finished Goods", "Transit", "Returns"]
+
+
+def synthetic_interactions(size: int, seed: int = 0):
+    """Yield (query, response, department) tuples spread across the departments."""
+    rng = np.random.default_rng(seed)
+    departments = rng.integers(0, len(DEPARTMENTS), size)
+    for i in range(size):
+        department = DEPARTMENTS[departments[i]]
+        query, response = TEMPLATES[department]
+        values = {
+            "period": PERIODS[rng.integers(len(PERIODS))],
+            "region": REGIONS[rng.integers(len(REGIONS))],
+            "warehouse": WAREHOUSES[rng.integers(len(WAREHOUSES))],
+            "item": int(rng.integers(10000, 99999)),
+            "amount": int(rng.integers(1000, 10_000_000)),
+            "count": int(rng.integers(1, 500)),
+        }
+        yield query.format(**values), response.format(**values), department
+
+
+def index_policy(mode: str) -> IndexPolicy:
+    return IndexPolicy() if mode == "auto" else IndexPolicy.fixed(mode)
+
+
+def percentile_ms(samples: list, q: float) -> float:
+    return float(np.percentile(samples, q) * 1000) if samples else 0.0
+
+
+def rss_mb() -> float:
+    """Resident set size of this process, where /proc is available."""
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return float("nan")
+
+
+def recall_at_k(manager: FAISSContextManager, queries: list, k: int) -> float:
+    """Share of the exact top-k rows (IndexFlatL2 over the same vectors) that the partition returns."""
+    hits, total = 0, 0
+    for department in DEPARTMENTS:
+        department_queries = [query for query, query_department in queries if query_department == department]
+        partition = manager.partitions.get(department)
+        if not department_queries or partition is None or partition.ntotal == 0:
+            continue
+        exact = faiss.IndexFlatL2(manager.dim)
+        exact.add(partition.live_vectors())
+        exact_rows = np.asarray(partition.rows(), dtype="int64")
+        query_vectors = np.asarray(manager.embedder.embed_documents(department_queries), dtype="float32")
+        safe_k = min(k, partition.ntotal)
+        _, positions = exact.search(query_vectors, safe_k)
+        _, rows = partition.search(query_vectors, safe_k)
+        for expected, found in zip(exact_rows[positions], rows):
+            hits += len(set(expected.tolist()) & set(found.tolist()))
+            total += safe_k
+    return hits / total if total else 0.0
+
+
+def directory_bytes(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+
+def run_benchmark(mode: str, size: int, dim: int = 768, queries: int = 500, k: int = 2, seed: int = 0) -> dict:
+    embedder = HashingEmbeddings(dim=dim)
+    manager = FAISSContextManager(dim=dim, index_policy=index_policy(mode), embedder=embedder)
+    rss_before = rss_mb()
+
+    # store_interaction throughput, including draining the write-behind queue
+    interactions = list(synthetic_interactions(size, seed))
+    start = time.perf_counter()
+    for query, response, department in interactions:
+        manager.store_interaction(query, response, department)
+    manager.flush()
+    while manager._migrating:
+        time.sleep(0.05)
+    store_seconds = time.perf_counter() - start
+
+    # get_context latency on held-out queries drawn from the same distribution
+    probes = [(query, department) for query, _, department in synthetic_interactions(queries, seed + 1)]
+    latencies = []
+    for query, department in probes:
+        start = time.perf_counter()
+        manager.get_context(query, department, k=k)
+        latencies.append(time.perf_counter() - start)
+
+    recall = recall_at_k(manager, probes, k)
+    stats = manager.get_context_stats()
+    index_bytes = sum(len(partition.snapshot()[0]) for partition in manager.partitions.values())
+
+    # Persistence: full base write, then eager and lazy (memory-mapped) loads
+    directory = tempfile.mkdtemp(prefix="memory_benchmark_")
+    try:
+        path = os.path.join(directory, "context")
+        start = time.perf_counter()
+        manager.save_to_disk(path)
+        save_seconds = time.perf_counter() - start
+        disk_bytes = directory_bytes(directory)
+        load_seconds = {}
+        for lazy in (False, True):
+            loaded = FAISSContextManager(dim=dim, index_policy=index_policy(mode), embedder=embedder,
+                                         write_behind=False, lazy_load=lazy)
+            start = time.perf_counter()
+            loaded.load_from_disk(path)
+            load_seconds["lazy" if lazy else "eager"] = time.perf_counter() - start
+            loaded.close()
+    finally:
+        manager.close()
+        shutil.rmtree(directory, ignore_errors=True)
+
+    return {
+        "mode": mode,
+        "size": size,
+        "dim": dim,
+        "k": k,
+        "index_tiers": stats["index_tiers"],
+        "store_per_second": size / store_seconds if store_seconds else 0.0,
+        "get_context_p50_ms": percentile_ms(latencies, 50),
+        "get_context_p99_ms": percentile_ms(latencies, 99),
+        "recall_at_k": recall,
+        "metadata_bytes": stats["metadata_bytes"],
+        "index_bytes": index_bytes,
+        "rss_delta_mb": rss_mb() - rss_before,
+        "save_seconds": save_seconds,
+        "load_seconds": load_seconds["eager"],
+        "lazy_load_seconds": load_seconds["lazy"],
+        "disk_bytes": disk_bytes,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the FAISS context manager offline.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000],
+                        help="history sizes to build (up to 1000000)")
+    parser.add_argument("--modes", nargs="+", default=["flat", "hnsw"], choices=["flat", "hnsw", "auto"])
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="append JSON lines to this file as well as stdout")
+    args = parser.parse_args(argv)
+
+    for size in args.sizes:
+        for mode in args.modes:
+            # Keep stdout machine-readable: the context manager's progress prints go to stderr
+            with contextlib.redirect_stdout(sys.stderr):
+                result = run_benchmark(mode, size, dim=args.dim, queries=args.queries, k=args.k, seed=args.seed)
+            line = json.dumps(result)
+            print(line, flush=True)
+            if args.output:
+                with open(args.output, "a") as f:
+                    f.write(line + "\n")
+
+
+if __name__ == "__main__":
+    main()
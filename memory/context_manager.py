@@ -1,31 +1,124 @@
 import faiss
 import numpy as np
-from langchain_openai import OpenAIEmbeddings
 import uuid
 import json
 import time
 import os
+import queue
+import threading
+from memory.embedding_cache import CachedEmbeddings
+from memory.embedders import create_embedder, embedder_name
+from memory.segment_store import SegmentStore
+from memory.partition import DepartmentPartition
+from memory.context_table import ContextTable, content_hash
+from memory.index_policy import IndexPolicy
+from memory.locks import ReadWriteLock
+from workflows.tracing import span
 
 class FAISSContextManager:
-    def __init__(self, dim: int = 768, use_hnsw: bool = True):
+    def __init__(self, dim: int = 768, use_hnsw: bool = True, write_behind: bool = True,
+                 batch_size: int = 32, max_queue_size: int = 1024, flush_interval: float = 0.5,
+                 cache_dir: str = None, cache_size: int = 2048,
+                 checkpoint_path: str = None, compact_every: int = 16, lazy_load: bool = False,
+                 max_repair_backoff: float = 60.0, retention=None,
+                 maintenance_interval: float = 60.0, rebuild_ratio: float = 0.2,
+                 index_policy: IndexPolicy = None, embedder="together",
+                 dedup: bool = True, dedup_distance: float = 0.02):
         self.dim = dim
-        self.context_data = []
-        self.embedder = OpenAIEmbeddings(
-            openai_api_key=os.getenv("TOGETHER_API_KEY"),
-            openai_api_base="https://api.together.xyz/v1",
-            model="togethercomputer/m2-bert-80M-2k-retrieval"
-        )
-        if use_hnsw:
-            self.index = faiss.IndexHNSWFlat(dim, 16)
+        # Columnar metadata; context_data[row] materializes a row as a dict
+        self.context_data = ContextTable()
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        # Exclusive for writes (with self._lock), shared for searches (self._lock.read())
+        self._lock = ReadWriteLock()
+        # A backend name from memory.embedders ("together", "hashing") or any
+        # Embeddings instance; remote embedders are fronted by the embedding cache
+        if isinstance(embedder, str):
+            embedder = create_embedder(embedder, dim=dim)
+        self.embedding_model = embedder_name(embedder)
+        if getattr(embedder, "local", False) or isinstance(embedder, CachedEmbeddings):
+            self.embedder = embedder
         else:
-            self.index = faiss.IndexFlatL2(dim)
+            self.embedder = CachedEmbeddings(
+                embedder,
+                model_name=self.embedding_model,
+                dim=dim,
+                cache_dir=cache_dir,
+                max_memory_entries=cache_size
+            )
+        self.use_hnsw = use_hnsw
+        # Index type per partition; without a policy every partition is pinned
+        # to HNSW or flat as before. Growing partitions are migrated to their
+        # next tier by a background rebuild.
+        self.index_policy = index_policy or IndexPolicy.fixed("hnsw" if use_hnsw else "flat")
+        self._migrating = set()
+        # One DepartmentPartition (sub-index + row mapping) per department.
+        # With lazy_load, snapshot indexes are memory-mapped on first use and
+        # snapshot metadata is decoded only for the rows that are returned.
+        self.partitions = {}
+        self.lazy_load = lazy_load
 
-        print(f"✅ FAISS context manager initialized (dim={dim}, HNSW={use_hnsw})")
+        # Append-only persistence: rows after _persisted_rows (and their vectors
+        # in _unsaved) are written as the next delta segment on save.
+        self.checkpoint_path = checkpoint_path
+        self.compact_every = compact_every
+        self._persist_lock = threading.Lock()
+        self._persist_path = None
+        self._persisted_rows = 0
+        self._unsaved = []
+
+        # Rows whose embedding failed are kept out of the index and retried in
+        # batches with exponential backoff; _epoch invalidates in-flight repairs
+        # when the table is cleared or reloaded.
+        self._repair_rows = []
+        self.repaired_count = 0
+        self.max_repair_backoff = max_repair_backoff
+        self._repair_delay = 0.0
+        self._next_repair_at = 0.0
+        self._epoch = 0
+
+        # Retention: a RetentionPolicy for every department, or a dict of
+        # department -> RetentionPolicy ("*" as the fallback). A maintenance
+        # thread evicts, rebuilds partitions whose tombstone share exceeds
+        # rebuild_ratio and drops evicted rows from the table.
+        self.retention = retention
+        self.rebuild_ratio = rebuild_ratio
+        self.evicted_count = 0
+        self._removed_unsaved = []
+        self._stop = threading.Event()
+
+        # Duplicate suppression: an interaction whose normalized text is already
+        # stored, or whose vector lies within dedup_distance of a stored one
+        # (squared L2 relative to its own squared norm, ~2(1 - cos) for unit
+        # vectors; None disables this check), is merged into that entry: its hit
+        # counter and last access are bumped instead of adding a row.
+        self.dedup = dedup
+        self.dedup_distance = dedup_distance
+        self.merged_count = 0
+        self._touched_unsaved = set()
+        self._maintenance = None
+        if retention is not None:
+            self._maintenance = threading.Thread(
+                target=self._maintenance_loop, args=(maintenance_interval,), daemon=True
+            )
+            self._maintenance.start()
+
+        # Write-behind queue: interactions are embedded in batches by a worker thread
+        self._write_queue = queue.Queue(maxsize=max_queue_size)
+        self._worker = None
+        if write_behind:
+            self._worker = threading.Thread(target=self._write_loop, daemon=True)
+            self._worker.start()
+
+        print(f"✅ FAISS context manager initialized (dim={dim}, embedder={self.embedding_model}, index={self.index_policy.fixed_tier or 'auto'}, write_behind={write_behind})")
 
     def store_interaction(self, query: str, response: str, department: str) -> str:
         """
         Store a (query, response, department) pair in memory and FAISS.
-        Truncates text to avoid embedding API errors.
+        Truncates text to avoid embedding API errors. With write-behind enabled the
+        entry is queued and becomes searchable once the worker (or flush()) writes it.
+        Duplicates are merged into the stored entry; when written synchronously
+        the returned id is that entry's.
         """
         if not response or len(response.strip()) < 10:
             return None
@@ -33,20 +126,6 @@ class FAISSContextManager:
         # Truncate response to avoid embedding errors
         text_repr = f"Q: {query[:100]}\nA: {response[:200]}"
         text_repr_trunc = text_repr[:500]  # Safe length for embeddings
-        
-        vector = None
-        embedding_success = False
-
-        try:
-            embedding = self.embedder.embed_query(text_repr_trunc)
-            vector = np.array(embedding).astype('float32').reshape(1, -1)
-            self.index.add(vector)
-            embedding_success = True
-        except Exception as e:
-            print(f"⚠️ Embedding error: {str(e)}")
-            # Fallback: add a zero vector for index alignment
-            vector = np.zeros((1, self.dim), dtype='float32')
-            self.index.add(vector)
 
         context_entry = {
             "id": str(uuid.uuid4()),
@@ -55,73 +134,706 @@ class FAISSContextManager:
             "department": department,
             "timestamp": int(time.time()),
             "text": text_repr_trunc,
-            "embedding_success": embedding_success
+            "embedding_success": False
         }
-        self.context_data.append(context_entry)
+
+        if self._worker is None:
+            return self._write_batch([context_entry])[0]
+
+        try:
+            self._write_queue.put(context_entry, timeout=self.flush_interval)
+        except queue.Full:
+            # Queue is saturated: apply backpressure by writing inline
+            print("⚠️ Write queue full, storing interaction synchronously")
+            self._write_batch([context_entry])
         return context_entry["id"]
 
-    def get_context(self, query: str, department: str, k: int = 2) -> list:
+    def _write_loop(self):
+        """Background worker: drain the queue in batches and write them to the index."""
+        while True:
+            try:
+                first = self._write_queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                # Idle: use the time to re-embed entries that failed earlier
+                if self._repair_rows and time.time() >= self._next_repair_at:
+                    self.repair_embeddings()
+                continue
+            if first is None:
+                self._write_queue.task_done()
+                return
+            batch = [first]
+            stop = False
+            while len(batch) < self.batch_size:
+                try:
+                    entry = self._write_queue.get_nowait()
+                except queue.Empty:
+                    break
+                if entry is None:
+                    stop = True
+                    self._write_queue.task_done()
+                    break
+                batch.append(entry)
+            try:
+                self._write_batch(batch)
+                if self.checkpoint_path:
+                    self._checkpoint(self.checkpoint_path)
+            except Exception as e:
+                print(f"⚠️ Write-behind error: {str(e)}")
+            finally:
+                for _ in batch:
+                    self._write_queue.task_done()
+            if stop:
+                return
+
+    def _write_batch(self, entries: list) -> list:
+        """
+        Embed a batch of entries with one embed_documents call and add them in one
+        index.add. Returns the id each entry was stored under (merged duplicates
+        report the existing entry's id).
+        """
+        ids = [entry["id"] for entry in entries]
+        if self.dedup:
+            with self._lock:
+                entries = self._merge_exact_duplicates(entries, ids)
+            if not entries:
+                return ids
+        texts = [entry["text"] for entry in entries]
+        vectors = None
+        try:
+            embeddings = self.embedder.embed_documents(texts)
+            vectors = np.array(embeddings).astype('float32').reshape(len(entries), -1)
+            for entry in entries:
+                entry["embedding_success"] = True
+        except Exception as e:
+            # Keep the entries but leave them out of the index until repaired
+            print(f"⚠️ Embedding error: {str(e)}")
+
+        with self._lock:
+            if self.dedup and vectors is not None and self.dedup_distance is not None:
+                keep = self._merge_near_duplicates(entries, vectors, ids)
+                entries = [entries[i] for i in keep]
+                vectors = vectors[keep]
+                if not entries:
+                    return ids
+            start = len(self.context_data)
+            self.context_data.extend(entries)
+            rows = np.arange(start, start + len(entries), dtype="int64")
+            if vectors is None:
+                self._repair_rows.extend(int(row) for row in rows)
+            else:
+                self._add_vectors(vectors, rows)
+                self._unsaved.append((rows, vectors))
+        return ids
+
+    def _merge_exact_duplicates(self, entries: list, ids: list) -> list:
+        """Merge entries whose text is already stored (or earlier in the batch); return the rest."""
+        fresh = []
+        batch_hashes = {}
+        for entry in entries:
+            entry["content_hash"] = content_hash(entry["department"], entry["query"], entry["response"])
+            row = self.context_data.find_duplicate(entry["content_hash"])
+            if row >= 0:
+                self._merge_into(row, entry, ids)
+            elif entry["content_hash"] in batch_hashes:
+                first = batch_hashes[entry["content_hash"]]
+                first["hits"] = first.get("hits", 1) + entry.get("hits", 1)
+                first["timestamp"] = max(first["timestamp"], entry["timestamp"])
+                ids[ids.index(entry["id"])] = first["id"]
+                self.merged_count += 1
+            else:
+                batch_hashes[entry["content_hash"]] = entry
+                fresh.append(entry)
+        return fresh
+
+    def _merge_near_duplicates(self, entries: list, vectors, ids: list) -> list:
+        """Merge entries whose nearest stored vector is within dedup_distance; return indexes to keep."""
+        keep = []
+        codes = np.array([self.context_data.department_code(entry["department"]) for entry in entries])
+        for code in np.unique(codes):
+            members = np.flatnonzero(codes == code)
+            partition = self.partitions.get(self.context_data.departments[code])
+            if partition is None or partition.ntotal == 0:
+                keep.extend(members.tolist())
+                continue
+            distances, rows = partition.search(vectors[members], 1)
+            norms = np.maximum(np.einsum("ij,ij->i", vectors[members], vectors[members]), 1e-12)
+            for i, distance, row, norm in zip(members, distances[:, 0], rows[:, 0], norms):
+                if row >= 0 and distance / norm <= self.dedup_distance:
+                    self._merge_into(int(row), entries[i], ids)
+                else:
+                    keep.append(int(i))
+        return sorted(keep)
+
+    def _merge_into(self, row: int, entry: dict, ids: list):
+        """
+        Fold a duplicate entry into an existing row: bump hits and last access.
+        The timestamp dates the stored answer, so it only moves forward when
+        the duplicate gives the same answer; a near duplicate answered
+        differently leaves the row as old as its answer.
+        """
+        table = self.context_data
+        table.set_value(row, "hits", int(table.column("hits")[row]) + entry.get("hits", 1))
+        if table.record(row)["response"] == entry["response"]:
+            table.set_value(row, "timestamp", max(int(table.column("timestamp")[row]), entry["timestamp"]))
+        table.set_value(row, "last_accessed", max(int(table.column("last_accessed")[row]), entry["timestamp"]))
+        self._touched_unsaved.add(row)
+        ids[ids.index(entry["id"])] = table.record(row)["id"]
+        self.merged_count += 1
+
+    def repair_embeddings(self, max_rows: int = None) -> int:
+        """Re-embed a batch of failed entries and swap their vectors into the index."""
+        with self._lock:
+            rows = self._repair_rows[:max_rows or self.batch_size]
+            epoch = self._epoch
+            texts = [self.context_data[row]["text"] for row in rows]
+        if not rows:
+            return 0
+        try:
+            embeddings = self.embedder.embed_documents(texts)
+            vectors = np.array(embeddings).astype('float32').reshape(len(rows), -1)
+        except Exception as e:
+            self._repair_delay = min(max(self._repair_delay * 2, 1.0), self.max_repair_backoff)
+            self._next_repair_at = time.time() + self._repair_delay
+            print(f"⚠️ Embedding repair failed, retrying in {self._repair_delay:.0f}s: {str(e)}")
+            return 0
+        with self._lock:
+            if epoch != self._epoch:
+                return 0
+            # Rows evicted or cleared while we were embedding stay out of the index
+            rows = np.asarray(rows, dtype="int64")
+            alive = self.context_data.column("alive")[rows]
+            rows, vectors = rows[alive], vectors[alive]
+            self._add_vectors(vectors, rows)
+            for row in rows:
+                self.context_data.set_value(int(row), "embedding_success", True)
+            repaired = set(int(row) for row in rows)
+            self._repair_rows = [row for row in self._repair_rows if row not in repaired]
+            self._unsaved.append((rows, vectors))
+            self.repaired_count += len(rows)
+        self._repair_delay = 0.0
+        self._next_repair_at = 0.0
+        return len(rows)
+
+    def _new_partition(self):
+        tier = self.index_policy.initial_tier()
+        return DepartmentPartition(self.index_policy.factory(self.dim, tier), tier=tier)
+
+    def _add_vectors(self, vectors, rows):
+        """Add vectors to the sub-index of their rows' departments."""
+        rows = np.asarray(rows, dtype="int64")
+        codes = self.context_data.column("department")[rows]
+        for code in np.unique(codes):
+            department = self.context_data.departments[code]
+            if department not in self.partitions:
+                self.partitions[department] = self._new_partition()
+            mask = codes == code
+            self.partitions[department].add(vectors[mask], rows[mask])
+            self._schedule_migration(department)
+
+    def _schedule_migration(self, department: str):
+        """Start a background migration if the partition outgrew its index tier."""
+        partition = self.partitions.get(department)
+        if partition is None or department in self._migrating:
+            return
+        if not self.index_policy.should_migrate(partition.tier, partition.ntotal):
+            return
+        self._migrating.add(department)
+        threading.Thread(target=self.migrate_partition, args=(department,), daemon=True).start()
+
+    def migrate_partition(self, department: str) -> bool:
+        """
+        Rebuild a partition with the index type the policy picks for its size.
+        Training and building run off the main lock; stores and searches keep
+        using the old index until the new one is swapped in.
+        """
+        try:
+            with self._lock:
+                partition = self.partitions.get(department)
+                if partition is None or not self.index_policy.should_migrate(partition.tier, partition.ntotal):
+                    return False
+                tier = self.index_policy.tier_for(partition.ntotal)
+                state = partition.begin_rebuild(tier=tier)
+            state["factory"] = self.index_policy.factory(self.dim, tier, training_vectors=state["vectors"])
+            index = DepartmentPartition.build_index(state)
+            with self._lock:
+                if self.partitions.get(department) is partition and partition.finish_rebuild(state, index):
+                    print(f"📈 {department} memory index migrated to {tier} ({partition.ntotal} vectors)")
+                    return True
+            return False
+        except Exception as e:
+            print(f"⚠️ Index migration error for {department}: {str(e)}")
+            return False
+        finally:
+            self._migrating.discard(department)
+
+    def _partition_factory(self, tier: str, template=None):
+        """Index factory for a loaded partition, from its saved template when present."""
+        if template is not None:
+            return self.index_policy.factory_from_template(template)
+        if tier == "quantized":
+            raise ValueError("quantized partition snapshot is missing its template index")
+        return self.index_policy.factory(self.dim, tier)
+
+    def _read_partition(self, store: SegmentStore, manifest: dict, department: str, mmap: bool = False):
+        index, rows = store.read_base_partition(manifest, department, mmap=mmap)
+        return self.index_policy.configure(index), rows
+
+    def _queue_failed_rows(self, drop_vectors: bool):
+        """Queue rows without a real embedding for repair after a load."""
+        failed = np.flatnonzero(~self.context_data.column("embedding_success"))
+        self._repair_rows = [int(row) for row in failed]
+        if drop_vectors and len(failed):
+            # Older snapshots stored zero vectors for these rows
+            for partition in self.partitions.values():
+                partition.remove(failed)
+
+    def department_rows(self, department: str) -> list:
+        """context_data rows stored in a department's sub-index."""
+        partition = self.partitions.get(department)
+        return partition.rows() if partition is not None else []
+
+    def flush(self, timeout: float = None) -> bool:
+        """Block until every queued interaction has been written to the index."""
+        if self._worker is None:
+            return True
+        if timeout is None:
+            self._write_queue.join()
+            return True
+        deadline = time.time() + timeout
+        while self._write_queue.unfinished_tasks:
+            if time.time() >= deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def close(self):
+        """Drain pending writes and stop the background threads."""
+        self._stop.set()
+        if self._maintenance is not None:
+            self._maintenance.join()
+            self._maintenance = None
+        if self._worker is None:
+            return
+        self.flush()
+        self._write_queue.put(None)
+        self._worker.join()
+        self._worker = None
+
+    def embed_query(self, query: str) -> np.ndarray:
+        """The query's search vector, as get_context computes it; pass it back to skip re-embedding."""
+        with span("memory.embed", queries=1):
+            return np.asarray(self.embedder.embed_query(query[:500]), dtype='float32')
+
+    def get_context(self, query: str, department: str, k: int = 2, query_vector=None) -> list:
         """
         Retrieve the k most relevant context entries for a given query and department.
+        Only the department's own sub-index is searched.
+        """
+        query_vectors = None if query_vector is None else [query_vector]
+        return self.get_context_batch([query], department, k=k, query_vectors=query_vectors)[0]
+
+    def get_context_batch(self, queries: list, departments, k: int = 2, query_vectors=None) -> list:
         """
-        if len(self.context_data) == 0 or self.index.ntotal == 0:
-            return []
+        Retrieve context for many queries at once: one embedding call for all of
+        them and one multi-row search per department sub-index. `departments` is
+        a single department or one per query; returns one result list per query.
+        `query_vectors` (from embed_query, one per query) skips the embedding call.
+        """
+        if isinstance(departments, str):
+            departments = [departments] * len(queries)
+        results = [[] for _ in queries]
+        # Skip embedding queries whose department has nothing to search
+        wanted = [i for i, department in enumerate(departments)
+                  if department in self.partitions and self.partitions[department].ntotal > 0]
+        if not wanted:
+            return results
         try:
-            # Truncate query for embedding to avoid errors
-            query_embedding = self.embedder.embed_query(query[:500])
-            query_vector = np.array(query_embedding).astype('float32').reshape(1, -1)
+            if query_vectors is not None:
+                embeddings = [query_vectors[i] for i in wanted]
+            else:
+                # Truncate queries for embedding to avoid errors
+                texts = [queries[i][:500] for i in wanted]
+                with span("memory.embed", queries=len(texts)):
+                    if len(texts) == 1:
+                        embeddings = [self.embedder.embed_query(texts[0])]
+                    else:
+                        embeddings = self.embedder.embed_documents(texts)
+            query_vectors = np.array(embeddings).astype('float32').reshape(len(wanted), -1)
         except Exception as e:
             print(f"⚠️ Query embedding error: {str(e)}")
-            return []
-        safe_k = min(k * 2, self.index.ntotal)
-        if safe_k == 0:
-            return []
-        distances, indices = self.index.search(query_vector, safe_k)
-        relevant_context = [
-            {
-                **self.context_data[idx],
-                "distance": float(distance)
-            }
-            for idx, distance in zip(indices[0], distances[0])
-            if 0 <= idx < len(self.context_data) and self.context_data[idx]["department"] == department
-        ]
-        relevant_context.sort(key=lambda x: x["distance"])
-        return relevant_context[:k]
+            return results
+        by_department = {}
+        for position, i in enumerate(wanted):
+            by_department.setdefault(departments[i], []).append((position, i))
+        with self._lock:
+            # Opening a lazily loaded snapshot mutates the partition, so do it exclusively
+            for department in by_department:
+                partition = self.partitions.get(department)
+                if partition is not None and not partition.is_loaded:
+                    partition.load()
+        # Searches only read the indexes and can run alongside other readers
+        with self._lock.read():
+            now = int(time.time())
+            for department, members in by_department.items():
+                partition = self.partitions.get(department)
+                if partition is None:
+                    continue
+                safe_k = min(k, partition.ntotal)
+                if safe_k == 0:
+                    continue
+                positions = [position for position, _ in members]
+                with span("memory.search", department=department, tier=partition.tier, k=safe_k):
+                    distances, rows = partition.search(query_vectors[positions], safe_k)
+                for (_, i), query_rows, query_distances in zip(members, rows, distances):
+                    for row in query_rows:
+                        if row >= 0:
+                            self.context_data.set_value(int(row), "last_accessed", now)
+                    relevant_context = [
+                        {
+                            **self.context_data[row],
+                            "distance": float(distance)
+                        }
+                        for row, distance in zip(query_rows, query_distances)
+                        if 0 <= row < len(self.context_data)
+                    ]
+                    relevant_context.sort(key=lambda x: x["distance"])
+                    results[i] = relevant_context[:k]
+        return results
 
     def save_to_disk(self, path: str) -> bool:
+        """Persist entries added since the last save as a delta segment."""
         try:
-            os.makedirs(os.path.dirname(path), exist_ok=True)
-            faiss.write_index(self.index, f"{path}.index")
-            with open(f"{path}.json", "w") as f:
-                json.dump(self.context_data, f)
-            print(f"💾 Context saved to {path}.index|json")
+            self.flush()
+            self._checkpoint(path)
+            print(f"💾 Context saved to {path}.manifest.json")
             return True
         except Exception as e:
             print(f"⚠️ Save error: {str(e)}")
             return False
 
+    def _checkpoint(self, path: str):
+        """Append unsaved rows to the segment log, compacting when it grows long."""
+        with self._persist_lock:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            store = SegmentStore(path)
+            if self._persist_path != path or not store.exists():
+                # First save to this path (or state diverged): write a full base
+                self._compact_locked(store)
+                return
+            with self._lock:
+                pending = self._unsaved
+                removed = self._removed_unsaved
+                touched_rows = sorted(self._touched_unsaved)
+                self._unsaved = []
+                self._removed_unsaved = []
+                self._touched_unsaved = set()
+                end_row = len(self.context_data)
+                entries = self.context_data.records(self._persisted_rows, end_row)
+                touched = np.stack([
+                    np.asarray(touched_rows, dtype="int64"),
+                    self.context_data.column("timestamp")[touched_rows],
+                    self.context_data.column("hits")[touched_rows].astype("int64"),
+                ], axis=1) if touched_rows else None
+            if not entries and not pending and not removed and not touched_rows:
+                return
+            if pending:
+                vector_rows = np.concatenate([rows for rows, _ in pending])
+                vectors = np.vstack([vectors for _, vectors in pending])
+            else:
+                vector_rows = np.empty(0, dtype="int64")
+                vectors = np.empty((0, self.dim), dtype="float32")
+            try:
+                manifest = store.append_segment(entries, vectors, vector_rows, removed, touched)
+            except Exception:
+                with self._lock:
+                    self._unsaved = pending + self._unsaved
+                    self._removed_unsaved = removed + self._removed_unsaved
+                    self._touched_unsaved.update(touched_rows)
+                raise
+            self._persisted_rows = end_row
+        if len(manifest["segments"]) >= self.compact_every:
+            threading.Thread(target=self.compact, args=(path,), daemon=True).start()
+
+    def compact(self, path: str) -> bool:
+        """Fold the base snapshot and all delta segments into a new base."""
+        try:
+            with self._persist_lock:
+                self._compact_locked(SegmentStore(path))
+            return True
+        except Exception as e:
+            print(f"⚠️ Compaction error: {str(e)}")
+            return False
+
+    def _compact_locked(self, store: SegmentStore):
+        with self._lock:
+            # A new base is a full rewrite anyway, so drop evicted rows first
+            self._vacuum_locked()
+            table = self.context_data.copy()
+            # Only copies are taken here; indexes are serialized after the lock is released
+            states = {department: partition.begin_snapshot() for department, partition in self.partitions.items()}
+            templates = {department: partition.template() for department, partition in self.partitions.items()}
+            tiers = {department: partition.tier for department, partition in self.partitions.items()}
+            self._unsaved = []
+            self._removed_unsaved = []
+            self._touched_unsaved = set()
+        snapshots = {department: DepartmentPartition.build_snapshot(state) for department, state in states.items()}
+        serialized = {department: snapshot[0] for department, snapshot in snapshots.items()}
+        rows = {department: snapshot[1] for department, snapshot in snapshots.items()}
+        try:
+            store.write_base(table, serialized, rows, templates, tiers, embedding_model=self.embedding_model)
+        except Exception:
+            self._persist_path = None
+            raise
+        self._persisted_rows = len(table)
+        self._persist_path = store.path
+
     def load_from_disk(self, path: str) -> bool:
         try:
-            if os.path.exists(f"{path}.index"):
-                self.index = faiss.read_index(f"{path}.index")
-            if os.path.exists(f"{path}.json"):
-                with open(f"{path}.json", "r") as f:
-                    self.context_data = json.load(f)
+            store = SegmentStore(path)
+            with self._persist_lock, self._lock:
+                if store.exists():
+                    manifest = store.read_manifest()
+                    saved_model = manifest.get("embedding_model")
+                    if saved_model and saved_model != self.embedding_model:
+                        print(f"⚠️ {path} was embedded with {saved_model}, not {self.embedding_model}; "
+                              f"retrieval quality will suffer until it is rebuilt")
+                    self.context_data = store.read_table(manifest, mmap=self.lazy_load)
+                    self.partitions = {}
+                    for department, count in manifest["departments"].items():
+                        template = store.read_template(manifest, department)
+                        tier = manifest.get("tiers", {}).get(department)
+                        if self.lazy_load:
+                            # Older snapshots did not record a tier; new indexes start at the policy's
+                            tier = tier or (IndexPolicy.tier_of(template) if template is not None else self.index_policy.initial_tier())
+                            loader = lambda department=department: self._read_partition(store, manifest, department, mmap=True)
+                            self.partitions[department] = DepartmentPartition(
+                                self._partition_factory(tier, template), loader, count, tier=tier
+                            )
+                        else:
+                            index, rows = self._read_partition(store, manifest, department)
+                            tier = tier or IndexPolicy.tier_of(index)
+                            self.partitions[department] = DepartmentPartition.from_index(
+                                self._partition_factory(tier, template), index, rows, tier=tier
+                            )
+                    # Replay delta segments on top of the base snapshot
+                    for entries, vectors, vector_rows, removed_rows, touched in store.read_segments(manifest):
+                        self.context_data.extend(entries)
+                        if len(vector_rows):
+                            self._add_vectors(vectors, vector_rows)
+                            for row in vector_rows:
+                                self.context_data.set_value(int(row), "embedding_success", True)
+                        for row, timestamp, hits in touched:
+                            self.context_data.set_value(int(row), "timestamp", timestamp)
+                            self.context_data.set_value(int(row), "hits", hits)
+                        if len(removed_rows):
+                            self._evict_rows(removed_rows, record=False)
+                    self._persist_path = path
+                    # Before version 3, failed rows were stored as zero vectors
+                    self._queue_failed_rows(drop_vectors=manifest.get("version", 1) < 3)
+                else:
+                    self._load_legacy(path)
+                    self._persist_path = None
+                    self._queue_failed_rows(drop_vectors=True)
+                self._persisted_rows = len(self.context_data)
+                self._unsaved = []
+                self._removed_unsaved = []
+                self._touched_unsaved = set()
+                self._epoch += 1
+                for department in list(self.partitions):
+                    self._schedule_migration(department)
             return True
         except Exception as e:
             print(f"⚠️ Load error: {str(e)}")
             return False
 
+    def _load_legacy(self, path: str):
+        """Load the pre-segment <path>.json + <path>[.<department>].index layout."""
+        if not os.path.exists(f"{path}.json"):
+            return
+        with open(f"{path}.json", "r") as f:
+            entries = json.load(f)
+        self.context_data = ContextTable()
+        self.context_data.extend(entries)
+        self.partitions = {}
+        department_rows = {}
+        for row, entry in enumerate(entries):
+            department_rows.setdefault(entry["department"], []).append(row)
+        for department, rows in department_rows.items():
+            if os.path.exists(f"{path}.{department}.index"):
+                index = self.index_policy.configure(faiss.read_index(f"{path}.{department}.index"))
+                tier = IndexPolicy.tier_of(index)
+                self.partitions[department] = DepartmentPartition.from_index(
+                    self._partition_factory(tier), index, rows, tier=tier
+                )
+        if not self.partitions and os.path.exists(f"{path}.index"):
+            self._split_legacy_index(faiss.read_index(f"{path}.index"))
+
+    def _split_legacy_index(self, index):
+        """Rebuild department sub-indexes from a single pre-partitioning index file."""
+        vectors = index.reconstruct_n(0, index.ntotal)
+        rows = np.flatnonzero(self.context_data.column("embedding_success")[:index.ntotal])
+        self._add_vectors(vectors[rows], rows)
+
+    def _policy_for(self, department: str):
+        if isinstance(self.retention, dict):
+            return self.retention.get(department, self.retention.get("*"))
+        return self.retention
+
+    def enforce_retention(self, now: float = None) -> int:
+        """Evict entries beyond each department's RetentionPolicy; returns how many."""
+        if self.retention is None:
+            return 0
+        now = time.time() if now is None else now
+        evicted = 0
+        with self._lock:
+            for department in list(self.context_data.departments):
+                policy = self._policy_for(department)
+                if policy is None:
+                    continue
+                rows = policy.select_evictions(self.context_data, department, now)
+                if len(rows):
+                    evicted += self._evict_rows(rows)
+        return evicted
+
+    def _evict_rows(self, rows, record: bool = True) -> int:
+        """Remove rows from the index and mark them dead in the table."""
+        rows = np.asarray(rows, dtype="int64")
+        rows = rows[self.context_data.column("alive")[rows]]
+        if not len(rows):
+            return 0
+        codes = self.context_data.column("department")[rows]
+        for code in np.unique(codes):
+            partition = self.partitions.get(self.context_data.departments[code])
+            if partition is not None:
+                partition.remove(rows[codes == code])
+        for row in rows:
+            self.context_data.set_value(int(row), "alive", False)
+        evicted = set(int(row) for row in rows)
+        self._repair_rows = [row for row in self._repair_rows if row not in evicted]
+        if record:
+            self._removed_unsaved.extend(evicted)
+            self.evicted_count += len(rows)
+        return len(rows)
+
+    def maintain_indexes(self) -> int:
+        """Rebuild partitions whose tombstones exceed rebuild_ratio, off the main lock."""
+        rebuilt = 0
+        for department in list(self.partitions):
+            with self._lock:
+                partition = self.partitions.get(department)
+                if partition is None or not partition.dead:
+                    continue
+                if partition.dead / (partition.ntotal + partition.dead) < self.rebuild_ratio:
+                    continue
+                state = partition.begin_rebuild()
+            index = DepartmentPartition.build_index(state)
+            with self._lock:
+                if self.partitions.get(department) is partition and partition.finish_rebuild(state, index):
+                    rebuilt += 1
+        return rebuilt
+
+    def vacuum(self):
+        """Drop evicted rows from the table so memory stays flat (forces a full save)."""
+        with self._persist_lock, self._lock:
+            self._vacuum_locked()
+
+    def _vacuum_locked(self):
+        if self.context_data.live_count() == len(self.context_data):
+            return
+        table, mapping = self.context_data.compacted()
+        for partition in self.partitions.values():
+            partition.remap_rows(mapping)
+        self._repair_rows = [int(mapping[row]) for row in self._repair_rows if mapping[row] >= 0]
+        self.context_data = table
+        # Row numbers changed: unsaved deltas no longer line up with the segment log
+        self._unsaved = []
+        self._removed_unsaved = []
+        self._touched_unsaved = set()
+        self._persist_path = None
+        self._epoch += 1
+
+    def _maintenance_loop(self, interval: float):
+        while not self._stop.wait(interval):
+            try:
+                self.enforce_retention()
+                self.maintain_indexes()
+                dead_rows = len(self.context_data) - self.context_data.live_count()
+                if dead_rows and dead_rows >= self.rebuild_ratio * len(self.context_data):
+                    self.vacuum()
+            except Exception as e:
+                print(f"⚠️ Memory maintenance error: {str(e)}")
+
+    def clear_department(self, department: str) -> int:
+        """Drop one department's entries and sub-index; returns how many entries were removed."""
+        self.flush()
+        with self._lock:
+            rows = self.context_data.rows_for_department(department)
+            self.partitions.pop(department, None)
+            for row in rows:
+                self.context_data.set_value(int(row), "alive", False)
+            removed = set(int(row) for row in rows)
+            self._repair_rows = [row for row in self._repair_rows if row not in removed]
+            self._removed_unsaved.extend(removed)
+        print(f"🧹 {department} context memory cleared")
+        return len(rows)
+
+    def merge_from(self, other) -> int:
+        """Append another manager's live entries and vectors (e.g. to consolidate per-department stores)."""
+        other.flush()
+        with other._lock:
+            old_rows = np.flatnonzero(other.context_data.column("alive"))
+            entries = [other.context_data.record(int(row)) for row in old_rows]
+            vectors = [(np.asarray(partition.rows(), dtype="int64"), partition.live_vectors())
+                       for partition in other.partitions.values()]
+            repair_rows = list(other._repair_rows)
+        with self._lock:
+            mapping = np.full(len(other.context_data), -1, dtype="int64")
+            mapping[old_rows] = np.arange(len(self.context_data), len(self.context_data) + len(old_rows))
+            self.context_data.extend(entries)
+            for rows, partition_vectors in vectors:
+                rows = mapping[rows]
+                if len(rows):
+                    self._add_vectors(partition_vectors, rows)
+                    self._unsaved.append((rows, partition_vectors))
+            self._repair_rows.extend(int(mapping[row]) for row in repair_rows if mapping[row] >= 0)
+        return len(entries)
+
     def clear_memory(self):
         """Clear all in-memory context and FAISS index."""
-        self.index.reset()
-        self.context_data = []
+        self.flush()
+        with self._lock:
+            self.partitions = {}
+            self.context_data = ContextTable()
+            self._unsaved = []
+            self._removed_unsaved = []
+            self._touched_unsaved = set()
+            self._repair_rows = []
+            self._epoch += 1
+            # Next save must rewrite the base rather than append to stale segments
+            self._persist_path = None
         print("🧹 Context memory cleared")
 
-    def get_context_stats(self) -> dict:
-        """Return info about memory size and FAISS index."""
+    def get_context_stats(self, department: str = None) -> dict:
+        """Return info about memory size and FAISS index (entries/vectors of one department if given)."""
+        if department is None:
+            entries = self.context_data.live_count()
+            vectors = sum(partition.ntotal for partition in self.partitions.values())
+        else:
+            entries = len(self.context_data.rows_for_department(department))
+            vectors = self.partitions[department].ntotal if department in self.partitions else 0
         return {
-            "entries": len(self.context_data),
-            "vectors": self.index.ntotal if hasattr(self.index, 'ntotal') else 0,
-            "dimensions": self.dim
+            "entries": entries,
+            "metadata_bytes": self.context_data.nbytes(),
+            "vectors": vectors,
+            "departments": {department: partition.ntotal for department, partition in self.partitions.items()},
+            "index_tiers": {department: partition.tier for department, partition in self.partitions.items()},
+            "dimensions": self.dim,
+            "embedder": self.embedding_model,
+            "pending_writes": self._write_queue.unfinished_tasks,
+            "pending_repairs": len(self._repair_rows),
+            "repaired": self.repaired_count,
+            "evicted": self.evicted_count,
+            "merged_duplicates": self.merged_count,
+            "dead_vectors": sum(partition.dead for partition in self.partitions.values()),
+            "embedding_cache": self.embedder.get_stats() if hasattr(self.embedder, "get_stats") else {}
         }
\ No newline at end of file
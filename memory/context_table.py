@@ -0,0 +1,306 @@
+import hashlib
+import json
+import os
+import threading
+import uuid
+
+import numpy as np
+
+
+class StringPool:
+    """
+    Deduplicated string storage referenced by int32 ids. A saved pool is a UTF-8
+    blob plus an offset table; loaded with mmap=True, strings are decoded on access.
+    """
+
+    def __init__(self):
+        self._strings = []
+        self._index = {}
+        self._blob = None
+        self._offsets = None
+        self._base_count = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self._base_count + len(self._strings)
+
+    def intern(self, value: str) -> int:
+        with self._lock:
+            string_id = self._index.get(value)
+            if string_id is None:
+                string_id = self._base_count + len(self._strings)
+                self._strings.append(value)
+                self._index[value] = string_id
+            return string_id
+
+    def get(self, string_id: int) -> str:
+        if string_id < self._base_count:
+            if self._blob is None:
+                return ""
+            start, end = int(self._offsets[string_id]), int(self._offsets[string_id + 1])
+            return bytes(self._blob[start:end]).decode("utf-8")
+        return self._strings[string_id - self._base_count]
+
+    def save(self, prefix: str):
+        offsets = [0]
+        with open(f"{prefix}.strings.bin", "wb") as f:
+            for string_id in range(len(self)):
+                f.write(self.get(string_id).encode("utf-8"))
+                offsets.append(f.tell())
+        np.save(f"{prefix}.strings.offsets.npy", np.asarray(offsets, dtype="int64"))
+
+    @classmethod
+    def load(cls, prefix: str, mmap: bool = False):
+        pool = cls()
+        offsets = np.load(f"{prefix}.strings.offsets.npy", mmap_mode="r" if mmap else None)
+        if mmap:
+            # Only strings interned after loading are deduplicated against each other
+            pool._offsets = offsets
+            pool._base_count = len(offsets) - 1
+            if offsets[-1]:
+                pool._blob = np.memmap(f"{prefix}.strings.bin", dtype="uint8", mode="r")
+            return pool
+        with open(f"{prefix}.strings.bin", "rb") as f:
+            blob = f.read()
+        for string_id in range(len(offsets) - 1):
+            value = blob[offsets[string_id]:offsets[string_id + 1]].decode("utf-8")
+            pool._strings.append(value)
+            pool._index.setdefault(value, string_id)
+        return pool
+
+
+def content_hash(department: str, query: str, response: str) -> int:
+    """64-bit hash of an interaction's case- and whitespace-normalized text (never 0)."""
+    normalized = "\0".join([department] + [" ".join(value.lower().split()) for value in (query, response)])
+    digest = hashlib.blake2b(normalized.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little") or 1
+
+
+class ContextTable:
+    """
+    Columnar store for context metadata. Each row is one interaction: uuid bytes,
+    int64 timestamp, interned department code, pooled query/response string ids,
+    an embedding flag, the last time it was retrieved, whether it is still
+    alive (not evicted), how many stored turns were merged into it and a hash
+    of its text for duplicate lookups. Rows are materialized as dicts only on
+    access; the prompt `text` is derived from query/response rather than stored.
+    """
+
+    COLUMNS = {
+        "timestamp": "int64",
+        "department": "int16",
+        "query": "int32",
+        "response": "int32",
+        "embedding_success": "bool",
+        "last_accessed": "int64",
+        "alive": "bool",
+        "hits": "int32",
+        "content_hash": "uint64",
+    }
+
+    def __init__(self):
+        self._size = 0
+        self._ids = np.empty((0, 16), dtype="uint8")
+        self._columns = {name: np.empty(0, dtype=dtype) for name, dtype in self.COLUMNS.items()}
+        self.departments = []
+        self._department_codes = {}
+        self.strings = StringPool()
+        # content_hash -> row, built on the first duplicate lookup
+        self._hash_rows = None
+
+    def __len__(self) -> int:
+        return self._size
+
+    def department_code(self, department: str) -> int:
+        code = self._department_codes.get(department)
+        if code is None:
+            code = len(self.departments)
+            self.departments.append(department)
+            self._department_codes[department] = code
+        return code
+
+    def _reserve(self, needed: int):
+        capacity = len(self._ids)
+        if needed <= capacity:
+            return
+        new_capacity = max(needed, capacity * 2, 64)
+        ids = np.zeros((new_capacity, 16), dtype="uint8")
+        ids[:self._size] = self._ids[:self._size]
+        self._ids = ids
+        for name, column in self._columns.items():
+            grown = np.zeros(new_capacity, dtype=column.dtype)
+            grown[:self._size] = column[:self._size]
+            self._columns[name] = grown
+
+    def extend(self, entries: list):
+        self._reserve(self._size + len(entries))
+        for entry in entries:
+            row = self._size
+            try:
+                self._ids[row] = np.frombuffer(uuid.UUID(entry["id"]).bytes, dtype="uint8")
+            except (KeyError, ValueError):
+                self._ids[row] = np.frombuffer(uuid.uuid4().bytes, dtype="uint8")
+            self._columns["timestamp"][row] = int(entry["timestamp"])
+            self._columns["department"][row] = self.department_code(entry["department"])
+            self._columns["query"][row] = self.strings.intern(entry["query"])
+            self._columns["response"][row] = self.strings.intern(entry["response"])
+            self._columns["embedding_success"][row] = bool(entry.get("embedding_success", True))
+            self._columns["last_accessed"][row] = int(entry.get("last_accessed", entry["timestamp"]))
+            self._columns["alive"][row] = True
+            self._columns["hits"][row] = int(entry.get("hits", 1))
+            self._columns["content_hash"][row] = entry.get("content_hash") or content_hash(
+                entry["department"], entry["query"], entry["response"]
+            )
+            if self._hash_rows is not None:
+                self._hash_rows[int(self._columns["content_hash"][row])] = row
+            self._size += 1
+
+    def append(self, entry: dict):
+        self.extend([entry])
+
+    def column(self, name: str):
+        """Read-only view of a column's live rows."""
+        view = self._columns[name][:self._size]
+        view.flags.writeable = False
+        return view
+
+    def set_value(self, row: int, name: str, value):
+        self._columns[name][row] = value
+
+    def rows_for_department(self, department: str, live_only: bool = True):
+        code = self._department_codes.get(department)
+        if code is None:
+            return np.empty(0, dtype="int64")
+        mask = self._columns["department"][:self._size] == code
+        if live_only:
+            mask &= self._columns["alive"][:self._size]
+        return np.flatnonzero(mask)
+
+    def find_duplicate(self, hash_value: int) -> int:
+        """Live row with the given content_hash, or -1."""
+        if self._hash_rows is None:
+            hashes = self._columns["content_hash"][:self._size]
+            rows = np.flatnonzero(self._columns["alive"][:self._size] & (hashes != 0))
+            self._hash_rows = dict(zip(hashes[rows].tolist(), rows.tolist()))
+        row = self._hash_rows.get(hash_value, -1)
+        return row if row >= 0 and self._columns["alive"][row] else -1
+
+    def live_count(self) -> int:
+        return int(np.count_nonzero(self._columns["alive"][:self._size]))
+
+    def compacted(self):
+        """
+        Copy without evicted rows. Returns (table, mapping) where mapping[old_row]
+        is the new row, or -1 for dropped rows; unreferenced strings are dropped too.
+        """
+        keep = np.flatnonzero(self._columns["alive"][:self._size])
+        mapping = np.full(self._size, -1, dtype="int64")
+        mapping[keep] = np.arange(len(keep), dtype="int64")
+        table = ContextTable()
+        table._size = len(keep)
+        table._ids = self._ids[keep].copy()
+        table._columns = {name: column[:self._size][keep].copy() for name, column in self._columns.items()}
+        table.departments = list(self.departments)
+        table._department_codes = dict(self._department_codes)
+        for name in ("query", "response"):
+            table._columns[name] = np.asarray(
+                [table.strings.intern(self.strings.get(int(string_id))) for string_id in table._columns[name]],
+                dtype="int32"
+            )
+        return table, mapping
+
+    def record(self, row: int) -> dict:
+        """Stored fields of a row (what persistence needs, without derived text)."""
+        if not 0 <= row < self._size:
+            raise IndexError("context row out of range")
+        return {
+            "id": str(uuid.UUID(bytes=self._ids[row].tobytes())),
+            "query": self.strings.get(int(self._columns["query"][row])),
+            "response": self.strings.get(int(self._columns["response"][row])),
+            "department": self.departments[self._columns["department"][row]],
+            "timestamp": int(self._columns["timestamp"][row]),
+            "embedding_success": bool(self._columns["embedding_success"][row]),
+            "last_accessed": int(self._columns["last_accessed"][row]),
+            "hits": int(self._columns["hits"][row]),
+        }
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return [self[row] for row in range(*item.indices(self._size))]
+        if item < 0:
+            item += self._size
+        entry = self.record(item)
+        entry["text"] = f"Q: {entry['query'][:100]}\nA: {entry['response'][:200]}"[:500]
+        return entry
+
+    def __iter__(self):
+        for row in range(self._size):
+            yield self[row]
+
+    def records(self, start: int = 0, end: int = None):
+        end = self._size if end is None else end
+        return [self.record(row) for row in range(start, end)]
+
+    def to_columns(self, names: list) -> dict:
+        """Decoded columns of live rows for display, e.g. {'timestamp': [...], 'department': [...]}."""
+        rows = np.flatnonzero(self._columns["alive"][:self._size])
+        columns = {}
+        for name in names:
+            if name == "department":
+                columns[name] = [self.departments[code] for code in self._columns[name][rows]]
+            elif name in ("query", "response"):
+                columns[name] = [self.strings.get(int(string_id)) for string_id in self._columns[name][rows]]
+            elif name == "id":
+                columns[name] = [str(uuid.UUID(bytes=self._ids[row].tobytes())) for row in rows]
+            else:
+                columns[name] = self._columns[name][rows].copy()
+        return columns
+
+    def copy(self):
+        """Snapshot of the current rows; the append-only string pool is shared."""
+        table = ContextTable()
+        table._size = self._size
+        table._ids = self._ids[:self._size].copy()
+        table._columns = {name: column[:self._size].copy() for name, column in self._columns.items()}
+        table.departments = list(self.departments)
+        table._department_codes = dict(self._department_codes)
+        table.strings = self.strings
+        return table
+
+    def nbytes(self) -> int:
+        """Approximate footprint of the numeric columns."""
+        return self._size * (16 + sum(np.dtype(dtype).itemsize for dtype in self.COLUMNS.values()))
+
+    def save(self, prefix: str):
+        np.save(f"{prefix}.ids.npy", self._ids[:self._size])
+        for name, column in self._columns.items():
+            np.save(f"{prefix}.col.{name}.npy", column[:self._size])
+        self.strings.save(prefix)
+        with open(f"{prefix}.table.json", "w") as f:
+            json.dump({"rows": self._size, "departments": self.departments}, f)
+
+    @classmethod
+    def load(cls, prefix: str, mmap: bool = False):
+        """Load a saved table. Numeric columns are read into RAM; with mmap the
+        string pool stays on disk and rows are decoded when accessed."""
+        table = cls()
+        with open(f"{prefix}.table.json", "r") as f:
+            meta = json.load(f)
+        table._size = meta["rows"]
+        table.departments = list(meta["departments"])
+        table._department_codes = {name: code for code, name in enumerate(table.departments)}
+        table._ids = np.load(f"{prefix}.ids.npy")
+        for name in cls.COLUMNS:
+            column_path = f"{prefix}.col.{name}.npy"
+            if os.path.exists(column_path):
+                table._columns[name] = np.load(column_path)
+            elif name == "last_accessed":
+                # Columns added after the snapshot was written get their defaults
+                table._columns[name] = table._columns["timestamp"].copy()
+            elif name == "content_hash":
+                # Unknown: such rows are only caught by the nearest-neighbour check
+                table._columns[name] = np.zeros(table._size, dtype=cls.COLUMNS[name])
+            else:
+                table._columns[name] = np.ones(table._size, dtype=cls.COLUMNS[name])
+        table.strings = StringPool.load(prefix, mmap=mmap)
+        return table
@@ -0,0 +1,84 @@
+import os
+import re
+import zlib
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_openai import OpenAIEmbeddings
+
+EMBEDDING_MODEL = "togethercomputer/m2-bert-80M-2k-retrieval"
+
+_TOKEN_PATTERN = re.compile(r"\w+")
+
+
+class HashingEmbeddings(Embeddings):
+    """
+    Local embeddings without a model or network: word n-grams are hashed
+    (crc32, stable across processes) into `dim` signed buckets, weighted by
+    sublinear term frequency and L2-normalized. Lexical rather than semantic,
+    but deterministic and fast enough for hot paths, offline use and benchmarks.
+    """
+
+    # Cheaper to recompute than to look up, so the context manager skips its cache
+    local = True
+
+    def __init__(self, dim: int = 768, ngram_range: tuple = (1, 2), lowercase: bool = True):
+        self.dim = dim
+        self.ngram_range = ngram_range
+        self.lowercase = lowercase
+        self.model_name = f"hashing-{dim}-ngram{ngram_range[0]}{ngram_range[1]}"
+
+    def _hashes(self, text: str):
+        tokens = _TOKEN_PATTERN.findall(text.lower() if self.lowercase else text)
+        low, high = self.ngram_range
+        features = []
+        for n in range(low, high + 1):
+            for start in range(len(tokens) - n + 1):
+                features.append(zlib.crc32(" ".join(tokens[start:start + n]).encode("utf-8")))
+        return np.asarray(features, dtype="uint64")
+
+    def embed_matrix(self, texts: list):
+        """Embed texts as a float32 (len(texts), dim) matrix."""
+        matrix = np.zeros((len(texts), self.dim), dtype="float32")
+        for row, text in enumerate(texts):
+            hashes = self._hashes(text)
+            if not len(hashes):
+                continue
+            # Low bits pick the bucket, bit 31 the sign, so collisions cancel out on average
+            signs = np.where(hashes & (1 << 31), -1.0, 1.0)
+            matrix[row] = np.bincount((hashes % self.dim).astype("int64"), weights=signs, minlength=self.dim)
+        matrix = np.sign(matrix) * np.log1p(np.abs(matrix))
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return matrix / np.where(norms > 0, norms, 1.0)
+
+    def embed_documents(self, texts: list) -> list:
+        return self.embed_matrix(texts).tolist()
+
+    def embed_query(self, text: str) -> list:
+        return self.embed_matrix([text])[0].tolist()
+
+
+def together_embeddings(dim: int = 768) -> Embeddings:
+    """Remote embeddings from the Together API (OpenAI-compatible endpoint)."""
+    return OpenAIEmbeddings(
+        openai_api_key=os.getenv("TOGETHER_API_KEY"),
+        openai_api_base="https://api.together.xyz/v1",
+        model=EMBEDDING_MODEL
+    )
+
+
+EMBEDDER_BACKENDS = {
+    "together": together_embeddings,
+    "hashing": lambda dim=768: HashingEmbeddings(dim=dim),
+}
+
+
+def create_embedder(backend: str = "together", dim: int = 768) -> Embeddings:
+    if backend not in EMBEDDER_BACKENDS:
+        raise ValueError(f"Unknown embedder '{backend}'. Options: {', '.join(EMBEDDER_BACKENDS)}")
+    return EMBEDDER_BACKENDS[backend](dim=dim)
+
+
+def embedder_name(embedder) -> str:
+    """Identifies the model behind an embedder, for cache keys and snapshot manifests."""
+    return getattr(embedder, "model_name", None) or getattr(embedder, "model", None) or type(embedder).__name__
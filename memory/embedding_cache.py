@@ -0,0 +1,207 @@
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from memory.locks import ProcessLock
+
+logger = logging.getLogger(__name__)
+
+# Disk tiers are shared by every cache that points at the same directory/model,
+# so the five department agents in one process append to a single matrix.
+_DISK_STORES = {}
+_DISK_STORES_LOCK = threading.Lock()
+
+
+def embedding_key(model_name: str, text: str) -> str:
+    """Cache key for a (model, truncated text) pair."""
+    return hashlib.sha1(f"{model_name}\0{text}".encode("utf-8")).hexdigest()
+
+
+class DiskEmbeddingStore:
+    """
+    Append-only on-disk embedding tier: a memory-mapped float32 matrix
+    (`<slug>.f32`) plus a key file (`<slug>.keys`) whose line N names row N.
+    Rows are numbered by the writing process, so only the process holding
+    `<slug>.lock` appends; any other opens the tier read-only.
+    """
+
+    def __init__(self, cache_dir: str, model_name: str, dim: int, growth: int = 1024):
+        self.dim = dim
+        self.growth = growth
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        slug = f"{hashlib.sha1(model_name.encode('utf-8')).hexdigest()[:12]}_{dim}"
+        self.matrix_path = os.path.join(cache_dir, f"{slug}.f32")
+        self.keys_path = os.path.join(cache_dir, f"{slug}.keys")
+        self._owner = ProcessLock(os.path.join(cache_dir, f"{slug}.lock"))
+        self.read_only = not self._owner.acquire()
+        if self.read_only:
+            logger.warning(f"⚠️ Embedding cache {self.matrix_path} is written by pid "
+                           f"{self._owner.owner() or 'unknown'}; using it read-only")
+
+        self._rows = {}
+        if os.path.exists(self.keys_path):
+            with open(self.keys_path, "r") as f:
+                keys = [line.strip() for line in f if line.strip()]
+            # Only trust rows whose vectors made it to disk
+            stored_rows = os.path.getsize(self.matrix_path) // (dim * 4) if os.path.exists(self.matrix_path) else 0
+            self._rows = {key: row for row, key in enumerate(keys[:stored_rows])}
+        self._count = len(self._rows)
+        self._capacity = 0
+        self._matrix = None
+        if os.path.exists(self.matrix_path):
+            self._capacity = os.path.getsize(self.matrix_path) // (dim * 4)
+            if self._capacity:
+                mode = "r" if self.read_only else "r+"
+                self._matrix = np.memmap(self.matrix_path, dtype="float32", mode=mode, shape=(self._capacity, dim))
+        self._keys_file = None if self.read_only else open(self.keys_path, "a")
+
+    def get(self, key: str):
+        with self._lock:
+            row = self._rows.get(key)
+            if row is None:
+                return None
+            return np.array(self._matrix[row])
+
+    def put_many(self, items: list):
+        """Append (key, vector) pairs that are not stored yet (no-op when read-only)."""
+        if self.read_only:
+            return
+        with self._lock:
+            new_items = [(key, vector) for key, vector in items if key not in self._rows]
+            if not new_items:
+                return
+            self._ensure_capacity(self._count + len(new_items))
+            start = self._count
+            for offset, (_, vector) in enumerate(new_items):
+                self._matrix[start + offset] = vector
+            self._matrix.flush()
+            # Keys are written after their vectors so a crash never indexes a missing row
+            for offset, (key, _) in enumerate(new_items):
+                self._rows[key] = start + offset
+                self._keys_file.write(f"{key}\n")
+            self._keys_file.flush()
+            self._count += len(new_items)
+
+    def _ensure_capacity(self, needed: int):
+        if needed <= self._capacity:
+            return
+        new_capacity = max(needed, self._capacity * 2, self.growth)
+        if self._matrix is not None:
+            self._matrix.flush()
+            del self._matrix
+        with open(self.matrix_path, "ab") as f:
+            f.truncate(new_capacity * self.dim * 4)
+        self._capacity = new_capacity
+        self._matrix = np.memmap(self.matrix_path, dtype="float32", mode="r+", shape=(new_capacity, self.dim))
+
+    @property
+    def entries(self) -> int:
+        return self._count
+
+    @property
+    def nbytes(self) -> int:
+        return self._capacity * self.dim * 4
+
+
+def get_disk_store(cache_dir: str, model_name: str, dim: int) -> DiskEmbeddingStore:
+    """Return the process-wide disk tier for a cache directory and model."""
+    key = (os.path.abspath(cache_dir), model_name, dim)
+    with _DISK_STORES_LOCK:
+        if key not in _DISK_STORES:
+            _DISK_STORES[key] = DiskEmbeddingStore(cache_dir, model_name, dim)
+        return _DISK_STORES[key]
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Two-tier embedding cache in front of an Embeddings client: an in-process
+    LRU with a size cap, backed by an optional memory-mapped disk tier that
+    survives restarts. Misses in embed_documents are fetched in one call.
+    """
+
+    def __init__(self, embedder, model_name: str, dim: int, cache_dir: str = None,
+                 max_memory_entries: int = 2048):
+        self.embedder = embedder
+        self.model_name = model_name
+        self.dim = dim
+        self.max_memory_entries = max_memory_entries
+        self.disk = get_disk_store(cache_dir, model_name, dim) if cache_dir else None
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _lookup(self, key: str):
+        with self._lock:
+            vector = self._lru.get(key)
+            if vector is not None:
+                self._lru.move_to_end(key)
+                self.memory_hits += 1
+                return vector
+        if self.disk is not None:
+            vector = self.disk.get(key)
+            if vector is not None:
+                with self._lock:
+                    self.disk_hits += 1
+                    self._remember(key, vector)
+                return vector
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def _remember(self, key: str, vector):
+        self._lru[key] = vector
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_memory_entries:
+            self._lru.popitem(last=False)
+
+    def _store(self, keys: list, embeddings: list):
+        vectors = [np.asarray(embedding, dtype="float32") for embedding in embeddings]
+        with self._lock:
+            for key, vector in zip(keys, vectors):
+                self._remember(key, vector)
+        if self.disk is not None:
+            # Vectors of an unexpected width would corrupt the fixed-width matrix
+            self.disk.put_many([(key, vector) for key, vector in zip(keys, vectors) if vector.shape == (self.dim,)])
+
+    def embed_query(self, text: str) -> list:
+        key = embedding_key(self.model_name, text)
+        vector = self._lookup(key)
+        if vector is None:
+            embedding = self.embedder.embed_query(text)
+            self._store([key], [embedding])
+            return list(embedding)
+        return vector.tolist()
+
+    def embed_documents(self, texts: list) -> list:
+        keys = [embedding_key(self.model_name, text) for text in texts]
+        results = [self._lookup(key) for key in keys]
+        missing = [i for i, vector in enumerate(results) if vector is None]
+        if missing:
+            embeddings = self.embedder.embed_documents([texts[i] for i in missing])
+            self._store([keys[i] for i in missing], embeddings)
+            for i, embedding in zip(missing, embeddings):
+                results[i] = np.asarray(embedding, dtype="float32")
+        return [vector.tolist() for vector in results]
+
+    def get_stats(self) -> dict:
+        """Hit rate and footprint of both cache tiers."""
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+                "memory_entries": len(self._lru),
+                "memory_bytes": len(self._lru) * self.dim * 4,
+                "disk_entries": self.disk.entries if self.disk else 0,
+                "disk_bytes": self.disk.nbytes if self.disk else 0,
+            }
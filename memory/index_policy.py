@@ -0,0 +1,118 @@
+import math
+
+import faiss
+import numpy as np
+
+TIERS = ("flat", "hnsw", "quantized")
+
+
+class IndexPolicy:
+    """
+    Chooses the FAISS index of each department partition from its size: exact
+    IndexFlatL2 for small histories, HNSW above `hnsw_threshold`, and an IVF
+    index with PQ (or SQ8) codes above `quantize_threshold`. Partitions only
+    move up a tier; the context manager migrates them in the background.
+    `IndexPolicy.fixed(tier)` pins every partition to one tier.
+    """
+
+    def __init__(self, hnsw_threshold: int = 20_000, quantize_threshold: int = 500_000,
+                 hnsw_m: int = 16, ef_construction: int = 40, ef_search: int = 32,
+                 quantizer: str = "pq", pq_bytes: int = 64, nprobe: int = 16,
+                 max_training_points: int = 100_000, fixed_tier: str = None):
+        if quantizer not in ("pq", "sq8"):
+            raise ValueError("quantizer must be 'pq' or 'sq8'")
+        if fixed_tier is not None and fixed_tier not in TIERS:
+            raise ValueError(f"Unknown index tier '{fixed_tier}'. Options: {', '.join(TIERS)}")
+        self.hnsw_threshold = hnsw_threshold
+        self.quantize_threshold = quantize_threshold
+        self.hnsw_m = hnsw_m
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self.quantizer = quantizer
+        self.pq_bytes = pq_bytes
+        self.nprobe = nprobe
+        self.max_training_points = max_training_points
+        self.fixed_tier = fixed_tier
+
+    @classmethod
+    def fixed(cls, tier: str, **kwargs):
+        return cls(fixed_tier=tier, **kwargs)
+
+    def tier_for(self, ntotal: int) -> str:
+        if self.fixed_tier is not None:
+            return self.fixed_tier
+        if ntotal >= self.quantize_threshold:
+            return "quantized"
+        if ntotal >= self.hnsw_threshold:
+            return "hnsw"
+        return "flat"
+
+    def initial_tier(self) -> str:
+        # A quantized partition needs training data, so fixed quantized starts flat
+        tier = self.tier_for(0)
+        return "flat" if tier == "quantized" else tier
+
+    def should_migrate(self, tier: str, ntotal: int) -> bool:
+        return TIERS.index(self.tier_for(ntotal)) > TIERS.index(tier)
+
+    def factory(self, dim: int, tier: str, training_vectors=None):
+        """Return a callable creating empty (trained) indexes of the given tier."""
+        if tier == "flat":
+            return lambda: faiss.IndexFlatL2(dim)
+        if tier == "hnsw":
+            def new_hnsw():
+                index = faiss.IndexHNSWFlat(dim, self.hnsw_m)
+                index.hnsw.efConstruction = self.ef_construction
+                index.hnsw.efSearch = self.ef_search
+                return index
+            return new_hnsw
+        if training_vectors is None or not len(training_vectors):
+            raise ValueError("A quantized index needs training vectors")
+        return self.factory_from_template(self._train_quantized(dim, training_vectors))
+
+    def _train_quantized(self, dim: int, vectors):
+        vectors = np.ascontiguousarray(vectors, dtype="float32")
+        if len(vectors) > self.max_training_points:
+            sample = np.random.default_rng(0).choice(len(vectors), self.max_training_points, replace=False)
+            vectors = vectors[np.sort(sample)]
+        # ~4*sqrt(n) lists, keeping the 39 points per centroid k-means asks for
+        nlist = max(1, min(int(4 * math.sqrt(len(vectors))), len(vectors) // 39))
+        if self.quantizer == "sq8":
+            codes = "SQ8"
+        else:
+            # PQ sub-quantizers must divide the dimension
+            codes = f"PQ{max(m for m in range(1, min(self.pq_bytes, dim) + 1) if dim % m == 0)}"
+        template = faiss.index_factory(dim, f"IVF{nlist},{codes}")
+        template.train(vectors)
+        return template
+
+    def factory_from_template(self, template):
+        """Factory cloning an empty, already trained template index."""
+        template = faiss.clone_index(template)
+        template.reset()
+
+        def new_from_template():
+            index = faiss.clone_index(template)
+            self.configure(index)
+            return index
+        return new_from_template
+
+    def configure(self, index):
+        """Apply search-time parameters, which are not all kept by write_index."""
+        if isinstance(index, faiss.IndexHNSW):
+            index.hnsw.efSearch = self.ef_search
+        ivf = faiss.try_extract_index_ivf(index)
+        if ivf is not None:
+            ivf.nprobe = self.nprobe
+            if ivf.direct_map.type == faiss.DirectMap.NoMap:
+                # Needed to reconstruct vectors during rebuilds and compaction
+                ivf.make_direct_map()
+        return index
+
+    @staticmethod
+    def tier_of(index) -> str:
+        if faiss.try_extract_index_ivf(index) is not None:
+            return "quantized"
+        if isinstance(index, faiss.IndexHNSW):
+            return "hnsw"
+        return "flat"
@@ -0,0 +1,136 @@
+import contextlib
+import os
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+class ReadWriteLock:
+    """
+    Reentrant writer lock that also admits concurrent readers. `with lock:`
+    takes it exclusively, like an RLock; `with lock.read():` shares it with
+    other readers. Waiting writers block new readers so writes are not starved.
+    The thread holding the write lock may read; a reader must not try to write.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = None
+        self._depth = 0
+        self._waiting_writers = 0
+
+    def acquire(self) -> bool:
+        me = threading.get_ident()
+        with self._cond:
+            if self._writer == me:
+                self._depth += 1
+                return True
+            self._waiting_writers += 1
+            try:
+                while self._writer is not None or self._readers:
+                    self._cond.wait()
+            finally:
+                self._waiting_writers -= 1
+            self._writer = me
+            self._depth = 1
+        return True
+
+    def release(self):
+        with self._cond:
+            if self._writer != threading.get_ident():
+                raise RuntimeError("cannot release un-acquired write lock")
+            self._depth -= 1
+            if not self._depth:
+                self._writer = None
+                self._cond.notify_all()
+
+    def __enter__(self):
+        return self.acquire()
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+    @contextlib.contextmanager
+    def read(self):
+        with self._cond:
+            if self._writer == threading.get_ident():
+                # Already exclusive: nothing else to wait for
+                owned = True
+            else:
+                owned = False
+                while self._writer is not None or self._waiting_writers:
+                    self._cond.wait()
+                self._readers += 1
+        try:
+            yield
+        finally:
+            if not owned:
+                with self._cond:
+                    self._readers -= 1
+                    if not self._readers:
+                        self._cond.notify_all()
+
+
+class ProcessLock:
+    """
+    Exclusive advisory lock on a file, held by at most one process at a time
+    (and released by the OS when that process exits). Guards on-disk stores
+    that number their rows per process and so must have a single writer.
+    The lock file holds the owner's pid.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+
+    def acquire(self) -> bool:
+        """Take the lock without blocking; False if another process holds it."""
+        if self._file is not None:
+            return True
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        f = open(self.path, "a+")
+        try:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            f.close()
+            return False
+        f.seek(0)
+        f.truncate()
+        f.write(str(os.getpid()))
+        f.flush()
+        self._file = f
+        return True
+
+    def release(self):
+        if self._file is None:
+            return
+        if fcntl is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+        else:
+            self._file.seek(0)
+            msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+        self._file.close()
+        self._file = None
+
+    @property
+    def held(self) -> bool:
+        return self._file is not None
+
+    def owner(self) -> str:
+        """Pid written by the current holder, if any."""
+        try:
+            with open(self.path, "r") as f:
+                return f.read().strip()
+        except OSError:
+            return ""
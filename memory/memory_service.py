@@ -0,0 +1,124 @@
+import inspect
+import os
+import threading
+
+from memory.context_manager import FAISSContextManager
+from memory.embedders import embedder_name
+from memory.index_policy import IndexPolicy
+from memory.locks import ProcessLock
+from memory.segment_store import SegmentStore
+
+SHARED_CONTEXT_PATH = "context_data/context_shared"
+
+# One context manager per snapshot path for the whole process, so every agent
+# and Streamlit session shares a single embedder, index set and write-behind queue.
+_SERVICES = {}
+_SERVICES_LOCK = threading.Lock()
+# Settings each service was created with, to catch callers expecting others
+_SETTINGS = {}
+_MANAGER_DEFAULTS = {
+    name: parameter.default
+    for name, parameter in inspect.signature(FAISSContextManager.__init__).parameters.items()
+    if name != "self"
+}
+# Store paths this process owns; see claim_store()
+_OWNERS = {}
+_OWNERS_LOCK = threading.Lock()
+
+
+def claim_store(path: str = SHARED_CONTEXT_PATH) -> ProcessLock:
+    """
+    Make this process the only writer of the context store at `path` for as
+    long as it runs. Segments and manifest rows are numbered per process, so a
+    second process appending to the same store would corrupt its history;
+    raises RuntimeError if another process already owns it.
+    """
+    key = os.path.abspath(path)
+    with _OWNERS_LOCK:
+        lock = _OWNERS.get(key)
+        if lock is None:
+            lock = ProcessLock(f"{path}.lock")
+            if not lock.acquire():
+                raise RuntimeError(
+                    f"Context store {path} is in use by another process (pid {lock.owner() or 'unknown'}); "
+                    "run a single worker per store"
+                )
+            _OWNERS[key] = lock
+        return lock
+
+
+def _comparable(name: str, value):
+    """A setting in a form that compares by value (embedder instances by model name)."""
+    if name == "embedder":
+        return value if isinstance(value, str) else embedder_name(value)
+    if isinstance(value, dict):
+        return {key: _comparable(name, item) for key, item in value.items()}
+    if hasattr(value, "__dict__"):
+        return type(value).__name__, vars(value)
+    return value
+
+
+def _service_settings(manager_kwargs: dict) -> dict:
+    settings = {**_MANAGER_DEFAULTS, **manager_kwargs}
+    if settings["index_policy"] is None:
+        settings["index_policy"] = IndexPolicy.fixed("hnsw" if settings["use_hnsw"] else "flat")
+    return {name: _comparable(name, value) for name, value in settings.items()}
+
+
+def get_memory_service(path: str = SHARED_CONTEXT_PATH, **manager_kwargs) -> FAISSContextManager:
+    """
+    Return the process-wide FAISSContextManager persisted at `path`, creating it
+    and loading its snapshot on first use. Departments are namespaced by the
+    manager's per-department partitions. `manager_kwargs` configure the manager
+    when it is created; later calls must pass the same settings (embedder
+    backend or model, policies by value) or get a ValueError, since one store cannot hold
+    two embedding spaces or honour two configurations. The process claims the
+    store first (see claim_store).
+    """
+    key = os.path.abspath(path)
+    settings = _service_settings(manager_kwargs)
+    with _SERVICES_LOCK:
+        manager = _SERVICES.get(key)
+        if manager is None:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            claim_store(path)
+            manager = FAISSContextManager(**manager_kwargs)
+            if SegmentStore(path).exists():
+                manager.load_from_disk(path)
+            _SERVICES[key] = manager
+            _SETTINGS[key] = settings
+            return manager
+        conflicts = [name for name, value in settings.items() if _SETTINGS[key][name] != value]
+        if conflicts:
+            raise ValueError(
+                f"Memory service {path} already runs with different {', '.join(conflicts)}; "
+                "give every agent the same memory settings or use shared_memory=False"
+            )
+        return manager
+
+
+def import_legacy_context(manager: FAISSContextManager, legacy_path: str, path: str = SHARED_CONTEXT_PATH) -> int:
+    """
+    Merge a per-agent context store (e.g. context_data/context_Sales) into the
+    shared one once, then save it. A `<legacy_path>.imported` marker stops the
+    store from being imported again.
+    """
+    marker = f"{legacy_path}.imported"
+    if os.path.exists(marker):
+        return 0
+    if not (SegmentStore(legacy_path).exists() or os.path.exists(f"{legacy_path}.json")):
+        return 0
+    legacy = FAISSContextManager(
+        dim=manager.dim,
+        write_behind=False,
+        embedder=manager.embedder,
+        index_policy=manager.index_policy,
+    )
+    if not legacy.load_from_disk(legacy_path):
+        return 0
+    imported = manager.merge_from(legacy)
+    if manager.save_to_disk(path):
+        with open(marker, "w") as f:
+            f.write(path)
+        print(f"📦 Imported {imported} entries from {legacy_path} into {path}")
+    return imported
@@ -0,0 +1,283 @@
+import faiss
+import numpy as np
+
+# Flat codes can be memory-mapped since faiss 1.9; older builds fall back to a normal read
+MMAP_FLAGS = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+
+
+class DepartmentPartition:
+    """
+    Vectors for one department, addressed by stable context_data row ids.
+    `base` is an optional read-only snapshot index (memory-mapped and opened on
+    first use when a loader is given); new vectors go to the in-RAM `delta`
+    index. Removed vectors are tombstoned by position, skipped at search time
+    and dropped when the partition is snapshotted or rebuilt. `tier` names the
+    index type new indexes get (see IndexPolicy); a rebuild can change it.
+    """
+
+    def __init__(self, index_factory, base_loader=None, base_count: int = 0, tier: str = "flat"):
+        self._index_factory = index_factory
+        self.tier = tier
+        self._base_loader = base_loader
+        self._base_count = base_count
+        self.base = None
+        self.base_rows = np.empty(0, dtype="int64")
+        self.delta = index_factory()
+        self.delta_rows = []
+        self._base_dead = set()
+        self._delta_dead = set()
+        # Bumped when rows are renumbered so in-flight rebuilds are discarded
+        self._generation = 0
+
+    @classmethod
+    def from_index(cls, index_factory, index, rows, tier: str = "flat"):
+        """Wrap an already loaded, writable index as the delta of a new partition."""
+        partition = cls(index_factory, tier=tier)
+        partition.delta = index
+        partition.delta_rows = [int(row) for row in rows]
+        return partition
+
+    def _ensure_base(self):
+        if self._base_loader is not None:
+            self.base, self.base_rows = self._base_loader()
+            self._base_loader = None
+
+    def load(self):
+        """Open the snapshot index now rather than on first use."""
+        self._ensure_base()
+
+    @property
+    def ntotal(self) -> int:
+        """Number of live (searchable) vectors."""
+        base_total = self._base_count if self._base_loader is not None else (self.base.ntotal if self.base is not None else 0)
+        return base_total + self.delta.ntotal - len(self._base_dead) - len(self._delta_dead)
+
+    @property
+    def dead(self) -> int:
+        return len(self._base_dead) + len(self._delta_dead)
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._base_loader is None
+
+    def add(self, vectors, rows):
+        self.delta.add(np.ascontiguousarray(vectors, dtype="float32"))
+        self.delta_rows.extend(int(row) for row in rows)
+
+    def remove(self, rows) -> int:
+        """Tombstone the vectors stored for the given rows; returns how many were live."""
+        self._ensure_base()
+        targets = np.asarray(list(rows), dtype="int64")
+        removed = 0
+        for positions, dead in ((self.base_rows, self._base_dead), (self.delta_rows, self._delta_dead)):
+            if not len(positions):
+                continue
+            for position in np.flatnonzero(np.isin(np.asarray(positions, dtype="int64"), targets)):
+                if int(position) not in dead:
+                    dead.add(int(position))
+                    removed += 1
+        return removed
+
+    def update(self, row: int, vector):
+        """Replace the vector stored for a row."""
+        self.remove([row])
+        self.add(np.asarray(vector, dtype="float32").reshape(1, -1), [row])
+
+    def _live_mask(self, kind: str):
+        index, dead = (self.base, self._base_dead) if kind == "base" else (self.delta, self._delta_dead)
+        mask = np.ones(index.ntotal if index is not None else 0, dtype=bool)
+        if dead:
+            mask[list(dead)] = False
+        return mask
+
+    def rows(self) -> list:
+        """Rows of the live vectors, in base-then-delta order."""
+        self._ensure_base()
+        base_rows = np.asarray(self.base_rows, dtype="int64")[self._live_mask("base")]
+        delta_rows = np.asarray(self.delta_rows, dtype="int64")[self._live_mask("delta")]
+        return np.concatenate([base_rows, delta_rows]).tolist()
+
+    def search(self, query_vectors, k: int):
+        """Return (distances, rows) of shape (nq, k); missing hits have row -1."""
+        self._ensure_base()
+        nq = len(query_vectors)
+        parts = []
+        for index, rows, dead in ((self.base, self.base_rows, self._base_dead),
+                                  (self.delta, self.delta_rows, self._delta_dead)):
+            if index is None or index.ntotal == 0:
+                continue
+            # Over-fetch by the tombstone count so k live hits survive filtering
+            fetch = min(k + len(dead), index.ntotal)
+            distances, positions = index.search(query_vectors, fetch)
+            if dead:
+                positions = np.where(np.isin(positions, list(dead)), -1, positions)
+            mapped = np.where(positions >= 0, np.asarray(rows, dtype="int64")[np.maximum(positions, 0)], -1)
+            parts.append((distances, mapped))
+        if not parts:
+            return np.full((nq, k), np.inf, dtype="float32"), np.full((nq, k), -1, dtype="int64")
+        distances = np.hstack([part[0] for part in parts])
+        rows = np.hstack([part[1] for part in parts])
+        distances = np.where(rows >= 0, distances, np.inf)
+        order = np.argsort(distances, axis=1, kind="stable")[:, :k]
+        distances = np.take_along_axis(distances, order, axis=1)
+        rows = np.take_along_axis(rows, order, axis=1)
+        if rows.shape[1] < k:
+            pad = k - rows.shape[1]
+            distances = np.pad(distances, ((0, 0), (0, pad)), constant_values=np.inf)
+            rows = np.pad(rows, ((0, 0), (0, pad)), constant_values=-1)
+        return distances, rows
+
+    def _reconstruct(self, kind: str, positions):
+        index = self.base if kind == "base" else self.delta
+        return index.reconstruct_batch(np.asarray(positions, dtype="int64"))
+
+    def merged_index(self):
+        """Single writable index holding the live vectors, in rows() order."""
+        self._ensure_base()
+        if not self.dead:
+            if self.base is None:
+                return self.delta
+            # Copy the snapshot graph and insert the delta instead of rebuilding
+            merged = faiss.deserialize_index(faiss.serialize_index(self.base))
+            if self.delta.ntotal:
+                merged.add(self.delta.reconstruct_n(0, self.delta.ntotal))
+            return merged
+        merged = self._index_factory()
+        vectors = self.live_vectors()
+        if len(vectors):
+            merged.add(vectors)
+        return merged
+
+    def live_vectors(self):
+        """Live vectors as a float32 matrix, in rows() order."""
+        self._ensure_base()
+        parts = []
+        for kind in ("base", "delta"):
+            positions = np.flatnonzero(self._live_mask(kind))
+            if len(positions):
+                parts.append(self._reconstruct(kind, positions))
+        if not parts:
+            return np.empty((0, self.delta.d), dtype="float32")
+        return np.vstack(parts)
+
+    def snapshot(self):
+        """(serialized index, rows) of the live vectors, without modifying the partition."""
+        return faiss.serialize_index(self.merged_index()), self.rows()
+
+    def begin_snapshot(self) -> dict:
+        """
+        Capture what snapshot() needs so the index can be serialized without the
+        owner's lock: the read-only base by reference, the live delta vectors and
+        rows by copy. Call under the lock; pass the result to build_snapshot().
+        """
+        self._ensure_base()
+        if self.base is None and not self._delta_dead:
+            # The delta is the whole index: copying its bytes keeps the graph and
+            # costs about as much as copying its vectors
+            return {"serialized": faiss.serialize_index(self.delta), "rows": self.rows()}
+        delta_live = np.flatnonzero(self._live_mask("delta"))
+        return {
+            "factory": self._index_factory,
+            "base": self.base,
+            "base_live": np.flatnonzero(self._live_mask("base")),
+            "base_dead": bool(self._base_dead),
+            "delta_vectors": self._reconstruct("delta", delta_live) if len(delta_live)
+            else np.empty((0, self.delta.d), dtype="float32"),
+            "rows": self.rows(),
+        }
+
+    @staticmethod
+    def build_snapshot(state: dict):
+        """(serialized index, rows) from begin_snapshot() state, as snapshot() returns."""
+        if "serialized" in state:
+            return state["serialized"], state["rows"]
+        base = state["base"]
+        if base is not None and not state["base_dead"]:
+            # Copy the snapshot graph and insert the delta instead of rebuilding
+            merged = faiss.deserialize_index(faiss.serialize_index(base))
+        else:
+            merged = state["factory"]()
+            if base is not None and len(state["base_live"]):
+                merged.add(base.reconstruct_batch(state["base_live"]))
+        if len(state["delta_vectors"]):
+            merged.add(state["delta_vectors"])
+        return faiss.serialize_index(merged), state["rows"]
+
+    def template(self):
+        """Serialized empty index from the factory, carrying any trained quantizer."""
+        return faiss.serialize_index(self._index_factory())
+
+    def rebuild(self, index_factory=None, tier: str = None):
+        """Drop tombstones and fold base + delta into one in-RAM index."""
+        state = self.begin_rebuild(index_factory, tier)
+        self.finish_rebuild(state, self.build_index(state))
+
+    def begin_rebuild(self, index_factory=None, tier: str = None) -> dict:
+        """
+        Capture the live vectors for a rebuild that runs without the owner's lock.
+        Call under the lock; build with build_index() outside it, then swap the
+        result in with finish_rebuild() under the lock again. The state's
+        "factory" may be replaced before building, e.g. by one trained on "vectors".
+        """
+        self._ensure_base()
+        return {
+            "factory": index_factory or self._index_factory,
+            "tier": tier or self.tier,
+            "base_live": np.flatnonzero(self._live_mask("base")),
+            "delta_live": np.flatnonzero(self._live_mask("delta")),
+            "generation": self._generation,
+            "rows": self.rows(),
+            "vectors": self.live_vectors(),
+            "base": self.base,
+            "delta": self.delta,
+            "delta_len": self.delta.ntotal,
+            "base_dead": set(self._base_dead),
+            "delta_dead": set(self._delta_dead),
+        }
+
+    @staticmethod
+    def build_index(state: dict):
+        index = state["factory"]()
+        if len(state["vectors"]):
+            if not index.is_trained:
+                index.train(state["vectors"])
+            index.add(state["vectors"])
+        return index
+
+    def finish_rebuild(self, state: dict, index) -> bool:
+        """Swap in a rebuilt index, replaying adds and removals made since begin_rebuild."""
+        if (self.base is not state["base"] or self.delta is not state["delta"]
+                or self._generation != state["generation"]):
+            # The partition was replaced or renumbered (reload, clear, another rebuild)
+            return False
+        # Live positions keep their order, so a position's new slot is its rank
+        base_live, delta_live = state["base_live"], state["delta_live"]
+        rows = list(state["rows"])
+        dead = set()
+        for position in self._base_dead - state["base_dead"]:
+            dead.add(int(np.searchsorted(base_live, position)))
+        for position in self._delta_dead - state["delta_dead"]:
+            if position < state["delta_len"]:
+                dead.add(len(base_live) + int(np.searchsorted(delta_live, position)))
+        added = [position for position in range(state["delta_len"], self.delta.ntotal) if position not in self._delta_dead]
+        if added:
+            index.add(self._reconstruct("delta", added))
+            rows.extend(self.delta_rows[position] for position in added)
+        self._index_factory = state["factory"]
+        self.tier = state["tier"]
+        self.base = None
+        self.base_rows = np.empty(0, dtype="int64")
+        self.delta = index
+        self.delta_rows = rows
+        self._base_dead = set()
+        self._delta_dead = dead
+        return True
+
+    def remap_rows(self, mapping):
+        """Renumber rows after the owning table dropped evicted rows (mapping[old] = new)."""
+        self._ensure_base()
+        self._generation += 1
+        if len(self.base_rows):
+            self.base_rows = mapping[np.asarray(self.base_rows, dtype="int64")]
+        if self.delta_rows:
+            self.delta_rows = [int(row) for row in mapping[np.asarray(self.delta_rows, dtype="int64")]]
@@ -0,0 +1,128 @@
+import re
+import threading
+import time
+
+import numpy as np
+
+from memory.embedders import embedder_name
+
+# Caches are shared by every agent using the same embedding model
+_CACHES = {}
+_CACHES_LOCK = threading.Lock()
+
+# Quoted phrases, numbers and capitalised words after the first: the parts of
+# a query that name what it is about and that embeddings barely separate
+_KEY_TERMS = re.compile(r"\"[^\"]+\"|'[^']+'|\d+(?:[.,:/-]\d+)*|(?<=\s)[A-Z][\w&.-]*")
+
+
+def key_terms(query: str) -> tuple:
+    """The numbers and quoted or capitalised entities in `query`, sorted."""
+    return tuple(sorted(_KEY_TERMS.findall(query.strip())))
+
+
+class ResponseCache:
+    """
+    Semantic cache of agent answers per department. A query whose embedding is
+    within `max_distance` of a cached query (squared L2 relative to the query's
+    squared norm, as for memory dedup) returns the cached answer if it was
+    stored less than its TTL ago and under the same `version_fn()` value, e.g.
+    mock_erp.operations.data_version, which every mutating operation bumps.
+    Both queries must also name the same numbers and entities (key_terms), so
+    "invoices over 500" never answers "invoices over 5000".
+    """
+
+    def __init__(self, embedder, ttl: float = 300.0, max_distance: float = 0.01,
+                 max_entries: int = 256, version_fn=None):
+        self.embedder = embedder
+        self.ttl = ttl
+        self.max_distance = max_distance
+        self.max_entries = max_entries
+        self.version_fn = version_fn or (lambda: 0)
+        self._entries = {}
+        self._vectors = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def embed(self, query: str):
+        return np.asarray(self.embedder.embed_query(query[:500]), dtype="float32")
+
+    def _prune(self, department: str, now: float, version: int):
+        entries = self._entries.get(department, [])
+        live = [entry for entry in entries if entry["expires_at"] > now and entry["version"] == version]
+        if len(live) > self.max_entries:
+            live = sorted(live, key=lambda entry: entry["created_at"])[-self.max_entries:]
+        if len(live) != len(entries) or department not in self._vectors:
+            self._entries[department] = live
+            self._vectors[department] = np.vstack([entry["vector"] for entry in live]) if live else None
+
+    def lookup(self, department: str, query: str, vector=None):
+        """Return (response, context_entries) for a similar recent query, or None."""
+        with self._lock:
+            if not self._entries.get(department):
+                self.misses += 1
+                return None
+        vector = self.embed(query) if vector is None else vector
+        now = time.time()
+        with self._lock:
+            self._prune(department, now, self.version_fn())
+            vectors = self._vectors.get(department)
+            if vectors is None:
+                self.misses += 1
+                return None
+            distances = np.sum((vectors - vector) ** 2, axis=1) / max(float(vector @ vector), 1e-12)
+            terms = key_terms(query)
+            distances[[entry["terms"] != terms for entry in self._entries[department]]] = np.inf
+            best = int(np.argmin(distances))
+            if distances[best] > self.max_distance:
+                self.misses += 1
+                return None
+            self.hits += 1
+            entry = self._entries[department][best]
+            return entry["response"], entry["context_entries"]
+
+    def store(self, department: str, query: str, response: str, context_entries: list = None,
+              vector=None, version: int = None, ttl: float = None):
+        """Cache an answer; pass the version read before answering so answers that raced a write are dropped."""
+        version = self.version_fn() if version is None else version
+        if version != self.version_fn():
+            return
+        vector = self.embed(query) if vector is None else vector
+        now = time.time()
+        with self._lock:
+            self._entries.setdefault(department, []).append({
+                "vector": np.asarray(vector, dtype="float32"),
+                "terms": key_terms(query),
+                "response": response,
+                "context_entries": list(context_entries or []),
+                "version": version,
+                "created_at": now,
+                "expires_at": now + (self.ttl if ttl is None else ttl),
+            })
+            self._vectors.pop(department, None)
+            self._prune(department, now, version)
+
+    def invalidate(self, department: str = None):
+        with self._lock:
+            for name in ([department] if department else list(self._entries)):
+                self._entries.pop(name, None)
+                self._vectors.pop(name, None)
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": sum(len(entries) for entries in self._entries.values()),
+            }
+
+
+def get_response_cache(embedder, **cache_kwargs) -> ResponseCache:
+    """Process-wide ResponseCache for an embedder's model; cache_kwargs apply on creation only."""
+    key = embedder_name(embedder)
+    with _CACHES_LOCK:
+        if key not in _CACHES:
+            _CACHES[key] = ResponseCache(embedder, **cache_kwargs)
+        return _CACHES[key]
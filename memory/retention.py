@@ -0,0 +1,34 @@
+import numpy as np
+
+EVICTION_POLICIES = ("oldest", "lru")
+
+
+class RetentionPolicy:
+    """
+    Bounds for one department's memory: at most `max_entries` live entries and
+    none older than `max_age` seconds. When over capacity, `eviction` picks the
+    victims: "oldest" by store time, or "lru" by when they were last retrieved.
+    """
+
+    def __init__(self, max_entries: int = None, max_age: float = None, eviction: str = "oldest"):
+        if eviction not in EVICTION_POLICIES:
+            raise ValueError(f"Unknown eviction policy '{eviction}'. Options: {', '.join(EVICTION_POLICIES)}")
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.eviction = eviction
+
+    def select_evictions(self, table, department: str, now: float):
+        """Rows of `department` in `table` that should be evicted."""
+        rows = table.rows_for_department(department)
+        if not len(rows):
+            return rows
+        evict = np.zeros(len(rows), dtype=bool)
+        if self.max_age is not None:
+            evict |= table.column("timestamp")[rows] < now - self.max_age
+        if self.max_entries is not None:
+            remaining = np.flatnonzero(~evict)
+            excess = len(remaining) - self.max_entries
+            if excess > 0:
+                key = table.column("last_accessed" if self.eviction == "lru" else "timestamp")[rows[remaining]]
+                evict[remaining[np.argsort(key, kind="stable")[:excess]]] = True
+        return rows[evict]
@@ -0,0 +1,172 @@
+import json
+import os
+import glob
+import re
+
+import faiss
+import numpy as np
+
+from memory.context_table import ContextTable
+from memory.partition import MMAP_FLAGS
+
+MANIFEST_VERSION = 3
+
+
+class SegmentStore:
+    """
+    Append-only on-disk layout for one context path:
+
+        <path>.manifest.json              base generation + ordered segment list
+        <path>.base-<gen>.table.json      ContextTable snapshot: row count, departments
+        <path>.base-<gen>.col.<name>.npy  ...its numeric columns and ids.npy
+        <path>.base-<gen>.strings.*       ...its string pool (UTF-8 blob + offsets)
+        <path>.base-<gen>.<dept>.index    department sub-index snapshots
+        <path>.base-<gen>.<dept>.rows.npy context_data row of each sub-index vector
+        <path>.base-<gen>.<dept>.template.index
+                                          empty index of the department's tier
+                                          (holds trained IVF/PQ parameters)
+        <path>.seg-<n>.jsonl              delta metadata (new rows) since the base
+        <path>.seg-<n>.npy / .rows.npy    delta vectors and the row each belongs to
+                                          (new rows or repaired older ones)
+        <path>.seg-<n>.removed.npy        rows evicted since the previous segment
+        <path>.seg-<n>.touched.npy        (row, timestamp, hits) of older rows that
+                                          absorbed duplicate interactions
+
+    Saves only append a segment; compaction folds everything into a new base.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.manifest_path = f"{path}.manifest.json"
+
+    def exists(self) -> bool:
+        return os.path.exists(self.manifest_path)
+
+    def read_manifest(self) -> dict:
+        if not self.exists():
+            return {"version": MANIFEST_VERSION, "generation": 0, "base_rows": 0,
+                    "departments": {}, "segments": [], "next_segment": 1}
+        with open(self.manifest_path, "r") as f:
+            return json.load(f)
+
+    def _write_manifest(self, manifest: dict):
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.manifest_path)
+
+    def _base_prefix(self, generation: int) -> str:
+        return f"{self.path}.base-{generation:06d}"
+
+    def _segment_prefix(self, number: int) -> str:
+        return f"{self.path}.seg-{number:06d}"
+
+    def append_segment(self, entries: list, vectors, vector_rows, removed_rows=(), touched=None) -> dict:
+        """Write new rows, vectors, evictions and row updates as a delta segment and register it in the manifest."""
+        manifest = self.read_manifest()
+        number = manifest["next_segment"]
+        prefix = self._segment_prefix(number)
+        np.save(f"{prefix}.npy", np.asarray(vectors, dtype="float32"))
+        np.save(f"{prefix}.rows.npy", np.asarray(vector_rows, dtype="int64"))
+        np.save(f"{prefix}.removed.npy", np.asarray(sorted(removed_rows), dtype="int64"))
+        np.save(f"{prefix}.touched.npy", np.asarray(touched if touched is not None else np.empty((0, 3)), dtype="int64").reshape(-1, 3))
+        with open(f"{prefix}.jsonl", "w") as f:
+            for entry in entries:
+                f.write(json.dumps(entry) + "\n")
+        start_row = manifest["base_rows"] + sum(segment["rows"] for segment in manifest["segments"])
+        manifest["segments"].append({"number": number, "start_row": start_row, "rows": len(entries)})
+        manifest["next_segment"] = number + 1
+        self._write_manifest(manifest)
+        return manifest
+
+    def write_base(self, table: ContextTable, serialized_partitions: dict, partition_rows: dict,
+                   templates: dict = None, tiers: dict = None, embedding_model: str = None) -> dict:
+        """Write a full snapshot as a new base generation and drop the old files."""
+        manifest = self.read_manifest()
+        generation = manifest["generation"] + 1
+        prefix = self._base_prefix(generation)
+        table.save(prefix)
+        for department, data in serialized_partitions.items():
+            np.asarray(data).tofile(f"{prefix}.{department}.index")
+            np.save(f"{prefix}.{department}.rows.npy", np.asarray(partition_rows[department], dtype="int64"))
+            if templates and department in templates:
+                np.asarray(templates[department]).tofile(f"{prefix}.{department}.template.index")
+        new_manifest = {
+            "version": MANIFEST_VERSION,
+            "generation": generation,
+            "base_rows": len(table),
+            "departments": {department: len(partition_rows[department]) for department in serialized_partitions},
+            "tiers": dict(tiers or {}),
+            "embedding_model": embedding_model,
+            "segments": [],
+            "next_segment": manifest["next_segment"],
+        }
+        self._write_manifest(new_manifest)
+        self._remove_stale_files(new_manifest)
+        return new_manifest
+
+    def _remove_stale_files(self, manifest: dict):
+        keep_base = self._base_prefix(manifest["generation"])
+        keep_segments = {segment["number"] for segment in manifest["segments"]}
+        for file_path in glob.glob(f"{glob.escape(self.path)}.base-*"):
+            if not file_path.startswith(keep_base + "."):
+                self._remove(file_path)
+        for file_path in glob.glob(f"{glob.escape(self.path)}.seg-*"):
+            match = re.search(r"\.seg-(\d+)\.", file_path[len(self.path):])
+            if not match or int(match.group(1)) not in keep_segments:
+                self._remove(file_path)
+
+    @staticmethod
+    def _remove(file_path: str):
+        try:
+            os.remove(file_path)
+        except OSError:
+            # Still open elsewhere (e.g. a lazily loaded snapshot on Windows);
+            # the next compaction retries.
+            pass
+
+    def read_table(self, manifest: dict, mmap: bool = False) -> ContextTable:
+        """Base snapshot metadata as a ContextTable (string pool memory-mapped if mmap)."""
+        if not manifest["generation"]:
+            return ContextTable()
+        prefix = self._base_prefix(manifest["generation"])
+        if manifest.get("version", 1) < 2:
+            # Version 1 snapshots stored metadata as JSON lines
+            table = ContextTable()
+            with open(f"{prefix}.jsonl", "r") as f:
+                table.extend([json.loads(line) for line in f if line.strip()])
+            return table
+        return ContextTable.load(prefix, mmap=mmap)
+
+    def read_base_partition(self, manifest: dict, department: str, mmap: bool = False):
+        """Return (index, rows) of a department's base snapshot, optionally memory-mapped."""
+        prefix = self._base_prefix(manifest["generation"])
+        index_path = f"{prefix}.{department}.index"
+        index = faiss.read_index(index_path, MMAP_FLAGS) if mmap else faiss.read_index(index_path)
+        rows = np.load(f"{prefix}.{department}.rows.npy", mmap_mode="r" if mmap else None)
+        return index, rows
+
+    def read_template(self, manifest: dict, department: str):
+        """Empty index of a department's tier, or None for snapshots written without one."""
+        template_path = f"{self._base_prefix(manifest['generation'])}.{department}.template.index"
+        if not os.path.exists(template_path):
+            return None
+        return faiss.read_index(template_path)
+
+    def read_segments(self, manifest: dict):
+        """Yield (entries, vectors, vector_rows, removed_rows, touched) for each delta segment in replay order."""
+        for segment in manifest["segments"]:
+            prefix = self._segment_prefix(segment["number"])
+            with open(f"{prefix}.jsonl", "r") as f:
+                entries = [json.loads(line) for line in f if line.strip()]
+            vectors = np.load(f"{prefix}.npy")
+            if os.path.exists(f"{prefix}.rows.npy"):
+                vector_rows = np.load(f"{prefix}.rows.npy")
+            else:
+                # Version 2 segments held one vector per new row
+                vector_rows = np.arange(segment["start_row"], segment["start_row"] + len(vectors), dtype="int64")
+            removed_rows = np.load(f"{prefix}.removed.npy") if os.path.exists(f"{prefix}.removed.npy") else np.empty(0, dtype="int64")
+            touched = np.load(f"{prefix}.touched.npy") if os.path.exists(f"{prefix}.touched.npy") else np.empty((0, 3), dtype="int64")
+            yield entries, vectors, vector_rows, removed_rows, touched
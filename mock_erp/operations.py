@@ -1,7 +1,36 @@
 from datetime import datetime, timedelta
+from functools import wraps
 import pandas as pd
 import random
 import re
+import threading
+
+# Bumped by every operation that changes ERP data, so cached answers computed
+# against older data can be recognized as stale.
+_data_version = 0
+# Writes read-modify-write the module DataFrames; one at a time across threads.
+# Reentrant because update_stock falls through to create_inventory_item.
+_write_lock = threading.RLock()
+
+def data_version() -> int:
+    return _data_version
+
+def mutates(func):
+    """
+    Mark an operation as changing ERP data: calls are serialized, bump
+    data_version(), and the function gets `mutates = True` for callers that
+    must not run it concurrently with other tool calls.
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        global _data_version
+        with _write_lock:
+            try:
+                return func(*args, **kwargs)
+            finally:
+                _data_version += 1
+    wrapper.mutates = True
+    return wrapper
 
 #  UTILITY FUNCTIONS 
 def standardize_item_id(item_id: str) -> str:
@@ -108,6 +137,7 @@ def get_sales_data(period="week"):
     filtered = [row for row in data if row["date"] >= cutoff]
     return filtered
 
+@mutates
 def create_lead(company: str, contact: str, details: str = "") -> dict:
     return {
         "id": f"LD-{random.randint(20000, 29999)}",
@@ -145,6 +175,7 @@ def get_low_stock_items(threshold: int = 20):
     df['quantity'] = pd.to_numeric(df['quantity'])
     return df[df['quantity'] < int(threshold)]
 
+@mutates
 def create_inventory_item(item_id: str, name: str, category: str = "Misc", 
                           quantity: int = 0, reorder_level: int = 10, 
                           warehouse: str = "Main"):
@@ -169,6 +200,7 @@ def create_inventory_item(item_id: str, name: str, category: str = "Misc",
     _inventory_df = df
     return new_item
 
+@mutates
 def update_stock(*args, **kwargs):
     global _inventory_df
     if len(args) >= 2:
@@ -222,6 +254,7 @@ def generate_mock_invoices(n=30):
     }
     return pd.DataFrame(data)
 
+@mutates
 def create_invoice(client: str, amount: float, due_date: str = None):
     global _invoices_df
     df = get_invoices()
@@ -251,6 +284,7 @@ def get_unpaid_invoices(client: str = None):
         unpaid = unpaid[unpaid['client'] == client]
     return unpaid.sort_values('due_date')
 
+@mutates
 def create_payment_entry(
     invoice_id: str, 
     amount: float, 
@@ -335,6 +369,7 @@ def get_leave_calendar(period: str = "this week"):
         })
     return pd.DataFrame(leave_data)
 
+@mutates
 def add_employee(name: str, position: str, department: str, start_date=None):
     global _employees_df
     df = get_employees()
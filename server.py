@@ -0,0 +1,301 @@
+from dotenv import load_dotenv
+load_dotenv()
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+
+import numpy as np
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel, Field
+
+from agents import AgentRegistry
+from memory.memory_service import SHARED_CONTEXT_PATH, claim_store
+from mock_erp.operations import OPERATIONS
+from workflows.workflow_engine import execute_workflow
+from workflows.tracing import current_request_id, get_ring_buffer, trace
+
+# HTTP API over the department agents, ERP workflows and shared memory.
+# Run with `python server.py` (or `uvicorn server:app`) as a single process:
+# it owns the on-disk memory store and embedding cache, which take one
+# writer, and serves concurrent requests from one set of agents. A second
+# process on the same context_data directory refuses to start.
+
+logger = logging.getLogger(__name__)
+
+# Agent turns allowed to run at once per department, and how many more may
+# wait for a slot before new requests are turned away with 503
+MAX_CONCURRENT_TURNS = int(os.getenv("API_MAX_CONCURRENT_TURNS", "8"))
+MAX_QUEUED_TURNS = int(os.getenv("API_MAX_QUEUED_TURNS", "32"))
+QUEUE_TIMEOUT = float(os.getenv("API_QUEUE_TIMEOUT", "30"))
+
+
+class Overloaded(Exception):
+    pass
+
+
+class DepartmentLimiter:
+    """Bounded concurrency with a bounded wait queue (backpressure) for one department."""
+
+    def __init__(self, max_concurrent: int, max_queued: int, queue_timeout: float):
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self.max_concurrent = max_concurrent
+        self.max_queued = max_queued
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.waiting = 0
+        self.rejected = 0
+
+    @asynccontextmanager
+    async def slot(self):
+        if self.waiting >= self.max_queued:
+            self.rejected += 1
+            raise Overloaded("queue full")
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise Overloaded("timed out waiting for a free slot")
+        finally:
+            self.waiting -= 1
+        self.active += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self._semaphore.release()
+
+    def get_stats(self) -> dict:
+        return {
+            "active": self.active,
+            "waiting": self.waiting,
+            "rejected": self.rejected,
+            "max_concurrent": self.max_concurrent,
+            "max_queued": self.max_queued,
+        }
+
+
+class LatencyTracker:
+    """Rolling window of request durations per route, reported as percentiles in ms."""
+
+    def __init__(self, window: int = 1000):
+        self.window = window
+        self._samples = {}
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def record(self, key: str, seconds: float):
+        with self._lock:
+            self._samples.setdefault(key, deque(maxlen=self.window)).append(seconds * 1000)
+            self._counts[key] = self._counts.get(key, 0) + 1
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            samples = {key: np.array(values) for key, values in self._samples.items()}
+            counts = dict(self._counts)
+        return {
+            key: {
+                "count": counts[key],
+                "p50_ms": round(float(np.percentile(values, 50)), 2),
+                "p95_ms": round(float(np.percentile(values, 95)), 2),
+                "p99_ms": round(float(np.percentile(values, 99)), 2),
+                "max_ms": round(float(values.max()), 2),
+            }
+            for key, values in samples.items()
+        }
+
+
+class QueryRequest(BaseModel):
+    query: str = Field(..., min_length=1)
+    timeout: float = Field(30, gt=0, le=300)
+
+
+class WorkflowRequest(BaseModel):
+    params: dict = Field(default_factory=dict)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Own the shared memory store before anything touches it, so a second
+    # process fails here instead of serving 500s once its agents are built
+    claim_store(SHARED_CONTEXT_PATH)
+    # AGENT_TOOL_MODE=react switches back to LangChain's one-tool-per-step executor
+    app.state.agents = AgentRegistry(tool_mode=os.getenv("AGENT_TOOL_MODE", "parallel"))
+    app.state.limiters = {
+        department: DepartmentLimiter(MAX_CONCURRENT_TURNS, MAX_QUEUED_TURNS, QUEUE_TIMEOUT)
+        for department in app.state.agents.agent_classes
+    }
+    app.state.latency = LatencyTracker()
+    app.state.started_at = time.time()
+    # Build every department in the background; requests for one still
+    # being built wait for it
+    app.state.agents.prewarm()
+    yield
+
+
+app = FastAPI(title="ERPNext AI Assistant API", lifespan=lifespan)
+
+
+@app.middleware("http")
+async def record_latency(request: Request, call_next):
+    start = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get("route")
+    key = f"{request.method} {route.path if route else request.url.path}"
+    request.app.state.latency.record(key, time.perf_counter() - start)
+    return response
+
+
+def context_summary(entry: dict) -> dict:
+    return {"query": entry["query"], "response": entry["response"],
+            "timestamp": entry["timestamp"], "distance": entry.get("distance")}
+
+
+async def get_agent(request: Request, department: str):
+    agents = request.app.state.agents
+    if department not in agents:
+        raise HTTPException(404, f"Unknown department '{department}'. Options: {', '.join(agents.agent_classes)}")
+    if agents.is_ready(department):
+        return agents[department]
+    return await asyncio.to_thread(agents.get, department)
+
+
+@app.post("/agents/{department}/query")
+async def query_agent(department: str, body: QueryRequest, request: Request):
+    agent = await get_agent(request, department)
+    limiter = request.app.state.limiters[department]
+    try:
+        async with limiter.slot():
+            with trace("http.query", department=department):
+                request_id = current_request_id()
+                start = time.perf_counter()
+                response, context_entries = await agent.arun(body.query, timeout=body.timeout)
+    except Overloaded as e:
+        return JSONResponse(
+            status_code=503,
+            content={"detail": f"{department} agent is busy ({e}); retry later"},
+            headers={"Retry-After": "1"},
+        )
+    return {
+        "department": department,
+        "response": response,
+        "context": [context_summary(entry) for entry in context_entries],
+        "request_id": request_id,
+        "duration_ms": round((time.perf_counter() - start) * 1000, 2),
+    }
+
+
+@app.post("/agents/{department}/stream")
+async def stream_agent(department: str, body: QueryRequest, request: Request):
+    """
+    The agent's turn events as newline-delimited JSON: "token" ("reset" drops
+    the tokens so far), "tool_start", "tool_end", then "final" (or "error" if
+    the department is overloaded).
+    """
+    agent = await get_agent(request, department)
+    limiter = request.app.state.limiters[department]
+    if limiter.waiting >= limiter.max_queued:
+        limiter.rejected += 1
+        return JSONResponse(
+            status_code=503,
+            content={"detail": f"{department} agent is busy (queue full); retry later"},
+            headers={"Retry-After": "1"},
+        )
+
+    async def events():
+        try:
+            async with limiter.slot():
+                with trace("http.stream", department=department):
+                    request_id = current_request_id()
+                    async for event in agent.astream(body.query, timeout=body.timeout):
+                        if event["type"] == "final":
+                            event = {**event, "context": [context_summary(entry) for entry in event["context"]],
+                                     "request_id": request_id}
+                        yield json.dumps(event, default=str) + "\n"
+        except Overloaded as e:
+            yield json.dumps({"type": "error", "detail": f"{department} agent is busy ({e}); retry later"}) + "\n"
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+
+@app.get("/workflows")
+async def list_workflows():
+    return {"operations": sorted(OPERATIONS)}
+
+
+@app.post("/workflows/{operation}")
+async def run_workflow(operation: str, body: WorkflowRequest):
+    if operation not in OPERATIONS:
+        raise HTTPException(404, f"Operation '{operation}' not found")
+    with trace("http.workflow", operation=operation):
+        request_id = current_request_id()
+        result = await asyncio.to_thread(execute_workflow, operation, body.params)
+    return {"operation": operation, "result": result, "request_id": request_id}
+
+
+@app.get("/memory/{department}/stats")
+async def memory_stats(department: str, request: Request):
+    agent = await get_agent(request, department)
+    return agent.get_context_stats()
+
+
+@app.get("/memory/{department}/context")
+async def memory_context(department: str, query: str, request: Request, k: int = 2):
+    agent = await get_agent(request, department)
+    entries = await asyncio.to_thread(agent.context_manager.get_context, query, department, k)
+    return {"context": [context_summary(entry) for entry in entries]}
+
+
+@app.post("/memory/{department}/save")
+async def memory_save(department: str, request: Request):
+    agent = await get_agent(request, department)
+    return {"result": await asyncio.to_thread(agent.save_context)}
+
+
+@app.delete("/memory/{department}")
+async def memory_clear(department: str, request: Request):
+    agent = await get_agent(request, department)
+    return {"result": await asyncio.to_thread(agent.clear_context)}
+
+
+@app.get("/health")
+async def health(request: Request):
+    agents = request.app.state.agents
+    return {
+        "status": "ok",
+        "uptime_s": round(time.time() - request.app.state.started_at, 1),
+        "agents": {
+            department: {
+                "ready": agents.is_ready(department),
+                "init_s": agents.init_times.get(department),
+                **request.app.state.limiters[department].get_stats(),
+            }
+            for department in agents.agent_classes
+        },
+    }
+
+
+@app.get("/metrics/latency")
+async def latency(request: Request):
+    return request.app.state.latency.get_stats()
+
+
+@app.get("/traces")
+async def traces(limit: int = 20):
+    return get_ring_buffer().traces(limit=limit)
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(
+        "server:app",
+        host=os.getenv("API_HOST", "0.0.0.0"),
+        port=int(os.getenv("API_PORT", "8000")),
+    )
@@ -0,0 +1,53 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from memory.context_manager import FAISSContextManager
+from memory.index_policy import IndexPolicy
+
+
+@pytest.fixture
+def make_manager():
+    """Offline FAISSContextManager factory (hashing embedder, synchronous writes, exact search)."""
+    managers = []
+
+    def make(**kwargs):
+        settings = dict(dim=64, embedder="hashing", write_behind=False, dedup=False,
+                        index_policy=IndexPolicy.fixed("flat"), maintenance_interval=3600)
+        settings.update(kwargs)
+        manager = FAISSContextManager(**settings)
+        managers.append(manager)
+        return manager
+
+    yield make
+    for manager in managers:
+        manager.close()
+
+
+def store_entries(manager, department: str, count: int, prefix: str = "entry", start: int = 0) -> list:
+    """Store `count` distinct interactions; returns their queries."""
+    queries = []
+    for i in range(start, start + count):
+        query = f"{prefix} {department} question {i}"
+        manager.store_interaction(query, f"{prefix} answer number {i} for {department}", department)
+        queries.append(query)
+    return queries
+
+
+def live_entries(manager) -> list:
+    """(department, query, response) of every live row, sorted."""
+    table = manager.context_data
+    alive = table.column("alive")
+    return sorted(
+        (entry["department"], entry["query"], entry["response"])
+        for row, entry in enumerate(table.records()) if alive[row]
+    )
+
+
+def assert_searchable(manager, department: str, queries: list):
+    for query in queries:
+        found = manager.get_context(query, department, k=1)
+        assert found and found[0]["query"] == query, query
@@ -0,0 +1,71 @@
+import pytest
+
+from memory.embedders import HashingEmbeddings
+from workflows.intent_router import IntentRouter
+
+
+@pytest.fixture
+def router():
+    return IntentRouter()
+
+
+@pytest.fixture
+def embedding_router():
+    # Lexical embeddings score paraphrases lower than a model would
+    return IntentRouter(HashingEmbeddings(dim=768), min_similarity=0.5, min_margin=0.0)
+
+
+@pytest.mark.parametrize("query, department, operation, params", [
+    ("Pending tasks", "Management", "get_task_summary", {"status": "pending"}),
+    ("Headcount report", "HR", "generate_hr_report", {"report_type": "headcount"}),
+    ("unpaid invoices for global tech", "Accounts", "get_unpaid_invoices", {"client": "Global Tech"}),
+    ("Open orders for This Month", "Sales", "get_open_orders", {"period": "this month"}),
+    ("Who is on leave Next Week?", "HR", "get_leave_calendar", {"period": "next week"}),
+    ("stock levels for product a", "Inventory", "get_stock_levels", {"item_name": "product a"}),
+    ("low stock items below 15", "Inventory", "get_low_stock_items", {"threshold": 15}),
+])
+def test_rule_hits_use_the_operation_spelling(router, query, department, operation, params):
+    match = router.route(query, department)
+    assert match["operation"] == operation
+    assert match["params"] == params
+
+
+@pytest.mark.parametrize("query, department", [
+    ("unpaid invoices for acme", "Accounts"),
+    ("stock levels for widgets", "Inventory"),
+    ("open orders for next week", "Sales"),
+    ("create an invoice for Global Tech", "Accounts"),
+    ("Pending tasks", "Sales"),
+])
+def test_unknown_values_and_other_departments_miss(router, query, department):
+    assert router.route(query, department) is None
+
+
+def test_stats_count_coercion_misses(router):
+    router.route("Pending tasks", "Management")
+    router.route("unpaid invoices for acme", "Accounts")
+    stats = router.get_stats()
+    assert (stats["hits"], stats["misses"], stats["rule_hits"]) == (1, 1, 1)
+
+
+@pytest.mark.parametrize("query, department, intent, params", [
+    ("which invoices have not been paid by Global Tech", "Accounts", "unpaid_invoices", {"client": "Global Tech"}),
+    ("show the staff list joined in 2024", "HR", "list_employees", {"joined_month": "2024"}),
+    ("what tasks are completed", "Management", "task_summary", {"status": "completed"}),
+    ("which invoices have not been paid", "Accounts", "unpaid_invoices", {}),
+])
+def test_embedding_hits_fill_declared_params(embedding_router, query, department, intent, params):
+    match = embedding_router.route(query, department)
+    assert match["method"] == "embedding"
+    assert (match["intent"], match["params"]) == (intent, params)
+
+
+@pytest.mark.parametrize("query, department", [
+    ("which invoices have not been paid by acme", "Accounts"),
+    ("current inventory on hand for product b", "Inventory"),
+    ("which invoices have not been paid global tech", "Accounts"),
+    ("pending customer orders next week", "Sales"),
+    ("what do we need to reorder for 3 months", "Inventory"),
+])
+def test_embedding_matches_with_uncaptured_filters_miss(embedding_router, query, department):
+    assert embedding_router.route(query, department) is None
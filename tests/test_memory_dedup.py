@@ -0,0 +1,24 @@
+def _only_row(manager):
+    table = manager.context_data
+    assert len(table) == 1
+    return table.record(0), int(table.column("hits")[0])
+
+
+def test_exact_duplicates_refresh_the_entry(make_manager):
+    manager = make_manager(dedup=True)
+    manager.store_interaction("show unpaid invoices", "three invoices are unpaid", "Accounts")
+    manager.context_data.set_value(0, "timestamp", 1000)
+    manager.store_interaction("show unpaid invoices", "three invoices are unpaid", "Accounts")
+    entry, hits = _only_row(manager)
+    assert hits == 2 and entry["timestamp"] > 1000
+
+
+def test_near_duplicates_keep_the_age_of_the_stored_answer(make_manager):
+    manager = make_manager(dedup=True, dedup_distance=0.5)
+    manager.store_interaction("show unpaid invoices", "three invoices are unpaid", "Accounts")
+    manager.context_data.set_value(0, "timestamp", 1000)
+    manager.store_interaction("show unpaid invoices", "four invoices are unpaid", "Accounts")
+    entry, hits = _only_row(manager)
+    assert manager.merged_count == 1 and hits == 2
+    assert (entry["response"], entry["timestamp"]) == ("three invoices are unpaid", 1000)
+    assert entry["last_accessed"] > 1000
@@ -0,0 +1,230 @@
+import json
+import os
+import threading
+
+import faiss
+import numpy as np
+import pytest
+
+from conftest import assert_searchable, live_entries, store_entries
+from memory.memory_service import import_legacy_context
+from memory.partition import DepartmentPartition
+from memory.retention import RetentionPolicy
+from memory.segment_store import SegmentStore
+
+
+@pytest.mark.parametrize("lazy_load", [False, True])
+def test_save_append_compact_reload(tmp_path, make_manager, lazy_load):
+    path = str(tmp_path / "context")
+    manager = make_manager()
+    sales = store_entries(manager, "Sales", 5)
+    hr = store_entries(manager, "HR", 3)
+    assert manager.save_to_disk(path)
+    store = SegmentStore(path)
+    assert store.read_manifest()["generation"] == 1
+
+    sales += store_entries(manager, "Sales", 4, start=5)
+    accounts = store_entries(manager, "Accounts", 2)
+    assert manager.save_to_disk(path)
+    manifest = store.read_manifest()
+    assert [segment["rows"] for segment in manifest["segments"]] == [6]
+    expected = live_entries(manager)
+
+    replayed = make_manager(lazy_load=lazy_load)
+    assert replayed.load_from_disk(path)
+    assert live_entries(replayed) == expected
+    assert_searchable(replayed, "Sales", sales)
+    assert_searchable(replayed, "Accounts", accounts)
+
+    # Rows stored after a reload continue the numbering of the replayed log
+    hr += store_entries(replayed, "HR", 2, start=3)
+    assert replayed.save_to_disk(path)
+    assert replayed.compact(path)
+    manifest = store.read_manifest()
+    assert manifest["generation"] == 2 and manifest["segments"] == []
+    assert not [name for name in os.listdir(tmp_path) if ".seg-" in name or ".base-000001" in name]
+
+    reloaded = make_manager(lazy_load=lazy_load)
+    assert reloaded.load_from_disk(path)
+    assert live_entries(reloaded) == live_entries(replayed)
+    assert_searchable(reloaded, "Sales", sales)
+    assert_searchable(reloaded, "HR", hr)
+
+
+def test_compaction_serializes_outside_the_lock(tmp_path, make_manager, monkeypatch):
+    path = str(tmp_path / "context")
+    manager = make_manager()
+    store_entries(manager, "Sales", 4)
+    manager.save_to_disk(path)
+    store_entries(manager, "Sales", 2, start=4)
+    manager.save_to_disk(path)
+
+    build_snapshot = DepartmentPartition.build_snapshot
+    late = []
+
+    def build_while_storing(state):
+        # A store from another thread must not wait for the snapshot to be built
+        writer = threading.Thread(target=lambda: late.extend(store_entries(manager, "Sales", 1, prefix="late")))
+        writer.start()
+        writer.join(timeout=5)
+        assert not writer.is_alive(), "store blocked by compaction"
+        return build_snapshot(state)
+
+    monkeypatch.setattr(DepartmentPartition, "build_snapshot", staticmethod(build_while_storing))
+    assert manager.compact(path)
+    assert late
+    manager.save_to_disk(path)
+
+    reloaded = make_manager()
+    reloaded.load_from_disk(path)
+    assert live_entries(reloaded) == live_entries(manager)
+    assert_searchable(reloaded, "Sales", late)
+
+
+def test_segments_replay_merges_and_evictions(tmp_path, make_manager):
+    path = str(tmp_path / "context")
+    manager = make_manager(dedup=True, retention=RetentionPolicy(max_entries=3))
+    store_entries(manager, "Sales", 3)
+    manager.save_to_disk(path)
+
+    # An exact repeat is merged into its row; older rows past capacity are evicted
+    manager.store_interaction("entry Sales question 2", "entry answer number 2 for Sales", "Sales")
+    newest = store_entries(manager, "Sales", 2, start=3)
+    assert manager.enforce_retention() == 2
+    manager.save_to_disk(path)
+    segment = SegmentStore(path).read_manifest()["segments"][0]
+    assert segment["rows"] == 2
+
+    reloaded = make_manager(lazy_load=True)
+    reloaded.load_from_disk(path)
+    assert live_entries(reloaded) == live_entries(manager)
+    assert [entry[1] for entry in live_entries(reloaded)] == ["entry Sales question 2"] + newest
+    assert_searchable(reloaded, "Sales", newest)
+    assert reloaded.context_data.record(2)["hits"] == 2
+
+
+def test_vacuum_remaps_rows(tmp_path, make_manager):
+    path = str(tmp_path / "context")
+    manager = make_manager(retention={"Sales": RetentionPolicy(max_entries=2)})
+    store_entries(manager, "Sales", 5)
+    hr = store_entries(manager, "HR", 3)
+    manager.save_to_disk(path)
+    assert manager.enforce_retention() == 3
+    manager.vacuum()
+
+    assert len(manager.context_data) == 5
+    kept = ["entry Sales question 3", "entry Sales question 4"]
+    assert_searchable(manager, "Sales", kept)
+    assert_searchable(manager, "HR", hr)
+    assert sorted(manager.context_data.record(row)["query"] for row in manager.department_rows("Sales")) == kept
+
+    # Renumbered rows cannot extend the old log: the next save writes a new base
+    manager.save_to_disk(path)
+    manifest = SegmentStore(path).read_manifest()
+    assert manifest["generation"] == 2 and manifest["base_rows"] == 5
+    reloaded = make_manager()
+    reloaded.load_from_disk(path)
+    assert live_entries(reloaded) == live_entries(manager)
+    assert_searchable(reloaded, "Sales", kept)
+
+
+def test_reads_version_2_segments_without_row_files(tmp_path, make_manager):
+    path = str(tmp_path / "context")
+    manager = make_manager()
+    store_entries(manager, "Sales", 3)
+    manager.save_to_disk(path)
+    added = store_entries(manager, "Sales", 2, start=3)
+    manager.save_to_disk(path)
+
+    store = SegmentStore(path)
+    manifest = store.read_manifest()
+    manifest["version"] = 2
+    for segment in manifest["segments"]:
+        for suffix in ("rows.npy", "removed.npy", "touched.npy"):
+            os.remove(f"{path}.seg-{segment['number']:06d}.{suffix}")
+    store._write_manifest(manifest)
+
+    reloaded = make_manager()
+    assert reloaded.load_from_disk(path)
+    assert live_entries(reloaded) == live_entries(manager)
+    assert_searchable(reloaded, "Sales", added)
+
+
+def test_reads_version_1_jsonl_base(tmp_path, make_manager):
+    path = str(tmp_path / "context")
+    manager = make_manager()
+    sales = store_entries(manager, "Sales", 4)
+    manager.save_to_disk(path)
+
+    store = SegmentStore(path)
+    manifest = store.read_manifest()
+    prefix = f"{path}.base-{manifest['generation']:06d}"
+    with open(f"{prefix}.jsonl", "w") as f:
+        for entry in manager.context_data.records():
+            f.write(json.dumps(entry) + "\n")
+    manifest["version"] = 1
+    store._write_manifest(manifest)
+
+    reloaded = make_manager()
+    assert reloaded.load_from_disk(path)
+    assert live_entries(reloaded) == live_entries(manager)
+    assert_searchable(reloaded, "Sales", sales)
+
+
+def _write_legacy(path, manager, per_department: bool):
+    entries = manager.context_data.records()
+    with open(f"{path}.json", "w") as f:
+        json.dump(entries, f)
+    vectors = np.asarray(manager.embedder.embed_documents(
+        [f"Q: {entry['query'][:100]}\nA: {entry['response'][:200]}" for entry in entries]
+    ), dtype="float32")
+    if per_department:
+        for department in {entry["department"] for entry in entries}:
+            index = faiss.IndexFlatL2(manager.dim)
+            index.add(vectors[[i for i, entry in enumerate(entries) if entry["department"] == department]])
+            faiss.write_index(index, f"{path}.{department}.index")
+    else:
+        index = faiss.IndexFlatL2(manager.dim)
+        index.add(vectors)
+        faiss.write_index(index, f"{path}.index")
+
+
+@pytest.mark.parametrize("per_department", [True, False])
+def test_loads_legacy_layout(tmp_path, make_manager, per_department):
+    source = make_manager()
+    sales = store_entries(source, "Sales", 3)
+    hr = store_entries(source, "HR", 2)
+    path = str(tmp_path / "context_legacy")
+    _write_legacy(path, source, per_department)
+
+    manager = make_manager()
+    assert manager.load_from_disk(path)
+    assert live_entries(manager) == live_entries(source)
+    assert_searchable(manager, "Sales", sales)
+    assert_searchable(manager, "HR", hr)
+
+    # The first save to a legacy path writes the segment layout
+    manager.save_to_disk(path)
+    reloaded = make_manager(lazy_load=True)
+    reloaded.load_from_disk(path)
+    assert live_entries(reloaded) == live_entries(source)
+
+
+def test_imports_legacy_store_once(tmp_path, make_manager):
+    source = make_manager()
+    sales = store_entries(source, "Sales", 3)
+    legacy_path = str(tmp_path / "context_Sales")
+    _write_legacy(legacy_path, source, per_department=True)
+
+    shared_path = str(tmp_path / "context_shared")
+    shared = make_manager()
+    hr = store_entries(shared, "HR", 2)
+    assert import_legacy_context(shared, legacy_path, shared_path) == 3
+    assert os.path.exists(f"{legacy_path}.imported")
+    assert import_legacy_context(shared, legacy_path, shared_path) == 0
+
+    reloaded = make_manager()
+    reloaded.load_from_disk(shared_path)
+    assert len(live_entries(reloaded)) == 5
+    assert_searchable(reloaded, "Sales", sales)
+    assert_searchable(reloaded, "HR", hr)
@@ -0,0 +1,56 @@
+from memory.embedders import HashingEmbeddings
+from memory.retention import RetentionPolicy
+
+
+class FlakyEmbeddings(HashingEmbeddings):
+    """Hashing embeddings that fail while `failing` is set and run `during` inside a batch call."""
+
+    def __init__(self, dim: int):
+        super().__init__(dim=dim)
+        self.failing = False
+        self.during = None
+
+    def embed_documents(self, texts: list) -> list:
+        if self.during is not None:
+            during, self.during = self.during, None
+            during()
+        if self.failing:
+            raise RuntimeError("embedding service unavailable")
+        return super().embed_documents(texts)
+
+
+def _store_unembedded(manager, embedder, department: str, queries: list):
+    embedder.failing = True
+    for query in queries:
+        manager.store_interaction(query, f"the answer to {query}", department)
+    embedder.failing = False
+
+
+def test_repair_indexes_failed_entries(make_manager):
+    embedder = FlakyEmbeddings(64)
+    manager = make_manager(embedder=embedder)
+    _store_unembedded(manager, embedder, "Sales", ["secret question one", "secret question two"])
+    assert manager.get_context("secret question one", "Sales") == []
+
+    assert manager.repair_embeddings() == 2
+    assert manager.get_context("secret question one", "Sales", k=1)[0]["query"] == "secret question one"
+
+
+def test_clearing_a_department_mid_repair_keeps_its_rows_out(make_manager):
+    embedder = FlakyEmbeddings(64)
+    manager = make_manager(embedder=embedder)
+    _store_unembedded(manager, embedder, "Sales", ["secret question one", "secret question two"])
+
+    embedder.during = lambda: manager.clear_department("Sales")
+    assert manager.repair_embeddings() == 0
+    assert manager.get_context("secret question one", "Sales") == []
+
+
+def test_eviction_mid_repair_keeps_evicted_rows_out(make_manager):
+    embedder = FlakyEmbeddings(64)
+    manager = make_manager(embedder=embedder, retention=RetentionPolicy(max_entries=1))
+    _store_unembedded(manager, embedder, "Sales", ["secret question one", "secret question two"])
+
+    embedder.during = manager.enforce_retention
+    assert manager.repair_embeddings() == 1
+    assert [entry["query"] for entry in manager.get_context("secret question", "Sales", k=5)] == ["secret question two"]
@@ -0,0 +1,85 @@
+import os
+import subprocess
+import sys
+import textwrap
+
+import numpy as np
+import pytest
+
+from memory.embedding_cache import DiskEmbeddingStore
+from memory.index_policy import IndexPolicy
+from memory.memory_service import claim_store, get_memory_service
+from memory.retention import RetentionPolicy
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _hold_in_subprocess(script: str):
+    """Start a process running `script`; returns once it prints "ready"."""
+    process = subprocess.Popen(
+        [sys.executable, "-c", f"import sys; sys.path.insert(0, {ROOT!r})\n" + textwrap.dedent(script)],
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True,
+    )
+    assert process.stdout.readline().strip() == "ready"
+    return process
+
+
+def _release(process):
+    process.stdin.close()
+    process.wait(timeout=10)
+
+
+def test_second_process_cannot_claim_store(tmp_path):
+    path = str(tmp_path / "context_shared")
+    owner = _hold_in_subprocess(f"""
+        from memory.memory_service import claim_store
+        claim_store({path!r})
+        print("ready", flush=True)
+        sys.stdin.read()
+    """)
+    try:
+        with pytest.raises(RuntimeError, match="in use by another process"):
+            claim_store(path)
+    finally:
+        _release(owner)
+    assert claim_store(path).held
+    assert claim_store(path) is claim_store(path)
+
+
+def test_disk_embedding_store_is_read_only_for_other_processes(tmp_path):
+    cache_dir = str(tmp_path / "cache")
+    owner = _hold_in_subprocess(f"""
+        import numpy as np
+        from memory.embedding_cache import DiskEmbeddingStore
+        store = DiskEmbeddingStore({cache_dir!r}, "model", 4)
+        store.put_many([("a", np.ones(4, dtype="float32"))])
+        print("ready", flush=True)
+        sys.stdin.read()
+    """)
+    try:
+        store = DiskEmbeddingStore(cache_dir, "model", 4)
+        assert store.read_only
+        store.put_many([("b", np.zeros(4, dtype="float32"))])
+        assert store.get("b") is None
+        np.testing.assert_array_equal(store.get("a"), np.ones(4, dtype="float32"))
+    finally:
+        _release(owner)
+    writer = DiskEmbeddingStore(cache_dir, "model", 4)
+    assert not writer.read_only
+    writer.put_many([("b", np.zeros(4, dtype="float32"))])
+    assert writer.get("b") is not None
+
+
+def test_service_rejects_conflicting_settings(tmp_path):
+    path = str(tmp_path / "context_shared")
+    settings = dict(dim=64, embedder="hashing", write_behind=False, index_policy=IndexPolicy(), lazy_load=True)
+    manager = get_memory_service(path, **settings)
+    try:
+        # Equal settings given as new objects are the same configuration
+        assert get_memory_service(path, **{**settings, "index_policy": IndexPolicy()}) is manager
+        for change in ({"embedder": "together"}, {"lazy_load": False},
+                       {"retention": RetentionPolicy(max_entries=10)}):
+            with pytest.raises(ValueError, match=next(iter(change))):
+                get_memory_service(path, **{**settings, **change})
+    finally:
+        manager.close()
@@ -0,0 +1,36 @@
+import pytest
+
+from memory.embedders import HashingEmbeddings
+from memory.response_cache import ResponseCache
+
+
+@pytest.fixture
+def cache():
+    return ResponseCache(HashingEmbeddings(dim=256), max_distance=0.5)
+
+
+def test_similar_query_hits(cache):
+    cache.store("Accounts", "show unpaid invoices over 500", "three invoices")
+    assert cache.lookup("Accounts", "Show the unpaid invoices over 500") == ("three invoices", [])
+    assert cache.lookup("Sales", "show unpaid invoices over 500") is None
+
+
+@pytest.mark.parametrize("query", [
+    "show unpaid invoices over 5000",
+    "show unpaid invoices over 500 for Global Tech",
+    'show unpaid invoices over 500 for "Ocean Logistics"',
+])
+def test_queries_naming_other_numbers_or_entities_miss(cache, query):
+    cache.store("Accounts", "show unpaid invoices over 500", "three invoices")
+    assert cache.lookup("Accounts", query) is None
+
+
+def test_version_change_and_invalidate_drop_entries(cache):
+    version = [0]
+    cache.version_fn = lambda: version[0]
+    cache.store("HR", "list all employees", "twenty employees")
+    version[0] += 1
+    assert cache.lookup("HR", "list all employees") is None
+    cache.store("HR", "list all employees", "twenty one employees")
+    cache.invalidate("HR")
+    assert cache.lookup("HR", "list all employees") is None
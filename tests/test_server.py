@@ -0,0 +1,22 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import server
+from test_memory_service import _hold_in_subprocess, _release
+
+
+def test_startup_fails_when_another_process_owns_the_store(tmp_path, monkeypatch):
+    path = str(tmp_path / "context_shared")
+    monkeypatch.setattr(server, "SHARED_CONTEXT_PATH", path)
+    owner = _hold_in_subprocess(f"""
+        from memory.memory_service import claim_store
+        claim_store({path!r})
+        print("ready", flush=True)
+        sys.stdin.read()
+    """)
+    try:
+        with pytest.raises(RuntimeError, match="in use by another process"):
+            with TestClient(server.app):
+                pass
+    finally:
+        _release(owner)
@@ -0,0 +1,101 @@
+import asyncio
+import json
+import threading
+import time
+from types import SimpleNamespace
+
+from langchain_core.tools import Tool
+
+from mock_erp import operations
+from workflows.param_wrappers import tool_with_named_args
+from workflows.tool_planner import ParallelToolExecutor
+
+
+class FakeLLM:
+    """Streams canned replies in small chunks, one reply per call."""
+
+    def __init__(self, replies):
+        self.replies = list(replies)
+
+    async def astream(self, prompt):
+        text = self.replies.pop(0)
+        for start in range(0, len(text), 7):
+            yield SimpleNamespace(content=text[start:start + 7])
+
+
+def plan(*calls):
+    return json.dumps({"tool_calls": [{"tool": tool, "input": tool_input} for tool, tool_input in calls]})
+
+
+def run_events(executor):
+    async def collect():
+        return [event async for event in executor.aiter_events({"input": "question"})]
+    return asyncio.run(collect())
+
+
+def accounts_tools():
+    return [
+        Tool(name="CreateInvoice", func=tool_with_named_args(operations.create_invoice), description="create"),
+        Tool(name="GetUnpaidInvoices", func=tool_with_named_args(operations.get_unpaid_invoices), description="list"),
+    ]
+
+
+def test_writes_in_one_plan_all_apply():
+    before = len(operations.get_invoices())
+    calls = [("CreateInvoice", f"client=Client {i}, amount=100") for i in range(6)]
+    executor = ParallelToolExecutor(FakeLLM([plan(*calls), "Created."]), accounts_tools(), max_calls=6)
+    result = executor.invoke({"input": "question"})
+    assert result["output"] == "Created."
+    invoices = operations.get_invoices()
+    assert len(invoices) == before + 6
+    assert invoices["id"].is_unique
+
+
+def test_reads_run_in_parallel_and_writes_after_them():
+    active, peak, order = [0], [0], []
+    lock = threading.Lock()
+
+    def slow(name, mutates=False):
+        def run(input_str):
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            time.sleep(0.05)
+            with lock:
+                active[0] -= 1
+                order.append(name)
+            return name
+        run.mutates = mutates
+        return Tool(name=name, func=run, description=name)
+
+    tools = [slow("ReadA"), slow("ReadB"), slow("WriteA", mutates=True), slow("WriteB", mutates=True)]
+    calls = [("WriteA", ""), ("ReadA", ""), ("WriteB", ""), ("ReadB", "")]
+    executor = ParallelToolExecutor(FakeLLM([plan(*calls), "Done."]), tools)
+    run_events(executor)
+    assert sorted(order[:2]) == ["ReadA", "ReadB"]
+    assert order[2:] == ["WriteA", "WriteB"]
+    assert peak[0] == 2
+
+
+def test_plan_after_a_preamble_runs_its_tools():
+    reply = "Sure! Here is the plan:\n```json\n" + plan(("GetUnpaidInvoices", "")) + "\n```"
+    executor = ParallelToolExecutor(FakeLLM([reply, "Three invoices are unpaid."]), accounts_tools())
+    events = run_events(executor)
+    assert [event["type"] for event in events if event["type"] != "token"] == ["tool_start", "tool_end", "output"]
+    assert events[-1]["output"] == "Three invoices are unpaid."
+    assert "".join(event["text"] for event in events if event["type"] == "token") == "Three invoices are unpaid."
+
+
+def test_streamed_text_followed_by_a_plan_is_reset():
+    preamble = "Let me check the ledger for every invoice that has not been settled yet before answering. "
+    executor = ParallelToolExecutor(FakeLLM([preamble + plan(("GetUnpaidInvoices", "")), "Done."]), accounts_tools())
+    types = [event["type"] for event in run_events(executor)]
+    assert "token" in types[:types.index("reset")]
+    assert types[types.index("reset") + 1:] == ["tool_start", "tool_end", "token", "output"]
+
+
+def test_answers_with_braces_are_not_plans():
+    answer = "Use the format {client} when filing."
+    events = run_events(ParallelToolExecutor(FakeLLM([answer]), accounts_tools()))
+    assert [event["type"] for event in events] == ["token", "output"]
+    assert events[0]["text"] == answer and events[-1]["output"] == answer
@@ -1,5 +1,6 @@
 import streamlit as st
 import pandas as pd
+import plotly.express as px
 import ast
 import re
 from datetime import date
@@ -93,4 +94,23 @@ def display_agent_result(result, heading=None):
         else:
             st.markdown(str(result))
     else:
-        st.markdown(str(result))
\ No newline at end of file
+        st.markdown(str(result))
+
+def display_trace_waterfall(trace):
+    """Horizontal bar per span of a workflows.tracing trace, offset by its start time."""
+    spans = pd.DataFrame(trace["spans"])
+    spans["label"] = [f"{i:02d} " + "· " * depth + name
+                      for i, (depth, name) in enumerate(zip(spans["depth"], spans["name"]))]
+    fig = px.bar(
+        spans,
+        x="duration_ms",
+        base="offset_ms",
+        y="label",
+        orientation="h",
+        color="depth",
+        hover_data={"name": True, "duration_ms": ":.1f", "offset_ms": ":.1f", "label": False, "depth": False},
+    )
+    fig.update_yaxes(autorange="reversed", title=None)
+    fig.update_xaxes(title="ms")
+    fig.update_layout(height=80 + 22 * len(spans), margin=dict(l=0, r=0, t=10, b=0), coloraxis_showscale=False)
+    st.plotly_chart(fig, use_container_width=True)
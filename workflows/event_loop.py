@@ -0,0 +1,130 @@
+import asyncio
+import contextvars
+import queue
+import threading
+
+_LOOP = None
+_LOOP_LOCK = threading.Lock()
+
+
+def get_event_loop() -> asyncio.AbstractEventLoop:
+    """Long-lived event loop running in a daemon thread, started on first use."""
+    global _LOOP
+    with _LOOP_LOCK:
+        if _LOOP is None or _LOOP.is_closed():
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="agent-event-loop", daemon=True).start()
+            _LOOP = loop
+        return _LOOP
+
+
+async def _in_context(coro, context: contextvars.Context):
+    # Tasks start from the loop thread's context; carry over the caller's
+    # context variables (e.g. the active trace span) instead
+    for var, value in context.items():
+        var.set(value)
+    return await coro
+
+
+def run_coroutine(coro, timeout: float = None):
+    """
+    Run a coroutine on the background loop and block until it finishes. The
+    coroutine sees the caller's context variables and is cancelled if the
+    wait times out or the caller is interrupted. Must not be called from a
+    running event loop; await the coroutine there.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        pass
+    else:
+        coro.close()
+        raise RuntimeError("run_coroutine() called from a running event loop; await the coroutine instead")
+    future = asyncio.run_coroutine_threadsafe(_in_context(coro, contextvars.copy_context()), get_event_loop())
+    try:
+        return future.result(timeout)
+    except BaseException:
+        future.cancel()
+        raise
+
+
+class _Raised:
+    """Carries an exception from a producer to the consumer of its items."""
+
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+_DONE = object()
+
+
+async def aiter_with_timeout(async_iterable, timeout: float = None):
+    """
+    Re-yield the items of an async iterable, produced in a task of its own,
+    raising asyncio.TimeoutError if the whole iteration outlasts `timeout`.
+    The producer is cancelled on timeout or when the consumer stops early.
+    """
+    loop = asyncio.get_running_loop()
+    items = asyncio.Queue()
+
+    async def produce():
+        try:
+            async for item in async_iterable:
+                items.put_nowait(item)
+        except Exception as e:
+            items.put_nowait(_Raised(e))
+        finally:
+            items.put_nowait(_DONE)
+
+    producer = asyncio.ensure_future(produce())
+    deadline = None if timeout is None else loop.time() + timeout
+    try:
+        while True:
+            remaining = None if deadline is None else max(deadline - loop.time(), 0)
+            item = await asyncio.wait_for(items.get(), remaining)
+            if item is _DONE:
+                return
+            if isinstance(item, _Raised):
+                raise item.error
+            yield item
+    finally:
+        producer.cancel()
+
+
+def iterate(async_iterable, timeout: float = None):
+    """
+    Iterate an async iterable on the background loop from synchronous code,
+    yielding items as they are produced (with the caller's context variables).
+    `timeout` bounds the wait for each item. Stopping early cancels the producer.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        pass
+    else:
+        raise RuntimeError("iterate() called from a running event loop; use async for instead")
+    items = queue.Queue()
+
+    async def produce():
+        try:
+            async for item in async_iterable:
+                items.put(item)
+        except Exception as e:
+            items.put(_Raised(e))
+        finally:
+            items.put(_DONE)
+
+    future = asyncio.run_coroutine_threadsafe(_in_context(produce(), contextvars.copy_context()), get_event_loop())
+    try:
+        while True:
+            try:
+                item = items.get(timeout=timeout)
+            except queue.Empty:
+                raise TimeoutError(f"no item within {timeout}s")
+            if item is _DONE:
+                return
+            if isinstance(item, _Raised):
+                raise item.error
+            yield item
+    finally:
+        future.cancel()
@@ -0,0 +1,355 @@
+import inspect
+import logging
+import re
+import threading
+
+import numpy as np
+
+from memory.embedders import embedder_name
+from mock_erp.operations import OPERATIONS, get_employees, get_inventory, get_invoices
+
+logger = logging.getLogger(__name__)
+
+# Routers are shared by every agent using the same embedding model
+_ROUTERS = {}
+_ROUTERS_LOCK = threading.Lock()
+
+_PERIODS = ["this week", "next week", "last week", "this month", "last month", "this quarter", "last quarter",
+            "week", "month", "year"]
+_PERIOD = rf"(?P<period>{'|'.join(_PERIODS)})"
+_JOINED = r"joined (?:in )?(?P<joined_month>jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec|\d{4}(?:-\d{2})?)"
+
+# Free-text parameters are checked against the ERP's current values; an item
+# name may be any part of a product name, as get_stock_levels matches substrings.
+KNOWN_VALUES = {
+    "client": lambda: get_invoices()["client"].unique(),
+    "item_name": lambda: get_inventory()["name"].unique(),
+    "employee_name": lambda: get_employees()["name"].unique(),
+}
+_SUBSTRING_PARAMS = {"item_name"}
+
+# Read-only intents that can be answered without the LLM. "patterns" are
+# anchored rules whose named groups become the operation's parameters;
+# "examples" are paraphrases for the embedding match, which then fills
+# parameters from "params" and gives up if anything in "required" is missing,
+# or if the rest of the query still holds a filter (see _carries_filter).
+# "choices" are the values an operation understands, in its spelling; a query
+# whose parameter is not one of them (or not in KNOWN_VALUES) is a miss.
+# Operations that change ERP data always go through the agent.
+INTENTS = {
+    "open_orders": {
+        "department": "Sales",
+        "operation": "get_open_orders",
+        "patterns": [rf"^(?:show |list |get )?(?:all |the )?open (?:sales )?orders(?: (?:for|from|in) {_PERIOD})?$"],
+        "examples": ["show open orders", "which sales orders are still open", "pending customer orders"],
+        "params": {"period": rf"\b(?P<period>this month|last month)\b"},
+        "choices": {"period": ["this month", "last month"]},
+    },
+    "sales_data": {
+        "department": "Sales",
+        "operation": "get_sales_data",
+        "patterns": [rf"^(?:show |get )?(?:the )?sales (?:data|figures|numbers)(?: (?:for )?(?:this |the last |last )?(?P<period>week|month|year))?$"],
+        "examples": ["show sales data", "daily sales figures", "how much did we sell recently"],
+        "params": {"period": r"\b(?P<period>week|month|year)\b"},
+        "choices": {"period": ["week", "month", "year"]},
+    },
+    "stock_levels": {
+        "department": "Inventory",
+        "operation": "get_stock_levels",
+        "patterns": [
+            r"^(?:show |check |get )?(?:the )?stock (?:levels?|status|quantity) (?:of|for) (?P<item_name>[\w\- ]+)$",
+            r"^how (?:many|much) (?:units of )?(?P<item_name>[\w\- ]+?) (?:is |are |do we have )?in stock$",
+        ],
+        "examples": ["stock levels for Product A", "how many units of Product B are in stock"],
+        "params": {"item_name": r"\b(?P<item_name>Product [A-Z0-9]+)\b"},
+        "required": ["item_name"],
+    },
+    "all_stock_levels": {
+        "department": "Inventory",
+        "operation": "get_stock_levels",
+        "patterns": [r"^(?:show |list |get )?(?:all |current |the )?stock levels?$"],
+        "examples": ["show all stock levels", "current inventory on hand"],
+    },
+    "low_stock_items": {
+        "department": "Inventory",
+        "operation": "get_low_stock_items",
+        "patterns": [r"^(?:show |list |get )?(?:all |the )?(?:low[- ]stock|items? low on stock)(?: items?)?(?: (?:below|under) (?P<threshold>\d+)(?: units)?)?$"],
+        "examples": ["which items are low on stock", "items below reorder level", "what do we need to reorder"],
+        "params": {"threshold": r"\b(?:below|under) (?P<threshold>\d+)\b"},
+    },
+    "unpaid_invoices": {
+        "department": "Accounts",
+        "operation": "get_unpaid_invoices",
+        "patterns": [r"^(?:show |list |get )?(?:all |the )?(?:unpaid|outstanding|overdue) invoices?(?: (?:for|from|of) (?P<client>[\w\-&. ]+?))?$"],
+        "examples": ["unpaid invoices", "which invoices have not been paid", "outstanding customer invoices"],
+        "params": {"client": r"\b(?:for|from|of|by) (?P<client>\w[\w\-&. ]*?)$"},
+    },
+    "revenue_snapshot": {
+        "department": "Accounts",
+        "operation": "get_revenue_snapshot",
+        "patterns": [rf"^(?:show |get |what (?:is|was) )?(?:the |our )?revenue(?: (?:for|in) {_PERIOD})?$"],
+        "examples": ["revenue for last month", "how much revenue did we make"],
+        "params": {"period": _PERIOD},
+        "choices": {"period": _PERIODS},
+    },
+    "leave_calendar": {
+        "department": "HR",
+        "operation": "get_leave_calendar",
+        "patterns": [
+            rf"^(?:show |get )?(?:the )?leave calendar(?: (?:for )?{_PERIOD})?$",
+            rf"^who is on leave(?: {_PERIOD})?$",
+        ],
+        "examples": ["show the leave calendar", "who is on leave this week", "upcoming employee vacations"],
+        "params": {"period": r"\b(?P<period>this week|next week|this month)\b"},
+        "choices": {"period": ["this week", "next week", "this month"]},
+    },
+    "list_employees": {
+        "department": "HR",
+        "operation": "list_employees",
+        "patterns": [rf"^(?:show |list |get )?(?:all |the )?employees(?: (?:who )?{_JOINED})?$"],
+        "examples": ["list all employees", "show the staff list"],
+        "params": {"joined_month": rf"\b{_JOINED}\b"},
+    },
+    "hr_report": {
+        "department": "HR",
+        "operation": "generate_hr_report",
+        "patterns": [r"^(?:generate |show |get )?(?:an? |the )?(?:hr )?(?P<report_type>headcount|turnover)(?: report)?$"],
+        "examples": ["headcount report", "how many people work here"],
+        "params": {"report_type": r"\b(?P<report_type>headcount|turnover)\b"},
+        "choices": {"report_type": ["headcount", "turnover"]},
+    },
+    "contract_status": {
+        "department": "HR",
+        "operation": "check_contract_status",
+        "patterns": [r"^(?:check |show |get )?(?:the )?contract (?:status|end date) (?:of|for) (?P<employee_name>[\w\-. ]+)$"],
+    },
+    "sales_performance": {
+        "department": "Management",
+        "operation": "get_sales_performance",
+        "patterns": [r"^(?:show |get )?(?:the )?top (?P<top_n>\d+) sales ?(?:people|persons|reps|performers)$"],
+        "examples": ["top sales performers", "best performing sales people"],
+        "params": {"top_n": r"\btop (?P<top_n>\d+)\b"},
+    },
+    "business_snapshot": {
+        "department": "Management",
+        "operation": "get_business_snapshot",
+        "patterns": [r"^(?:show |get )?(?:the |a )?business (?:snapshot|overview)$"],
+        "examples": ["business snapshot", "how is the business doing overall", "revenue expenses and profit overview"],
+    },
+    "task_summary": {
+        "department": "Management",
+        "operation": "get_task_summary",
+        "patterns": [r"^(?:show |list |get )?(?:all |the )?(?P<status>pending|completed|in progress) tasks$"],
+        "examples": ["pending tasks", "what tasks are still open"],
+        "params": {"status": r"\b(?P<status>pending|completed|in progress)\b"},
+        "choices": {"status": ["pending", "completed", "in progress"]},
+    },
+}
+
+
+class IntentRouter:
+    """
+    Maps unambiguous queries straight to an OPERATIONS entry. A query matching
+    an intent's rule is routed with the captured parameters, respelled as the
+    operation expects, unless one is not a value it knows; otherwise, with an
+    embedder, the closest intent example is accepted if its cosine similarity
+    is at least `min_similarity` and beats the next intent by `min_margin`.
+    Anything else is a miss and should go to the agent.
+    """
+
+    def __init__(self, embedder=None, intents: dict = None, min_similarity: float = 0.85,
+                 min_margin: float = 0.05):
+        self.embedder = embedder
+        self.intents = dict(intents or INTENTS)
+        self.min_similarity = min_similarity
+        self.min_margin = min_margin
+        self._rules = {
+            name: [re.compile(pattern, re.IGNORECASE) for pattern in intent.get("patterns", [])]
+            for name, intent in self.intents.items()
+        }
+        self._examples = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.rule_hits = 0
+        self.embedding_hits = 0
+        self.intent_hits = {}
+
+    @staticmethod
+    def _normalize(query: str) -> str:
+        return re.sub(r"\s+", " ", query).strip().rstrip("?.!").strip()
+
+    def _coerce(self, name: str, params: dict):
+        """
+        Drop empty captures, spell choices and known values the way the
+        operation expects and convert to its annotated types; None if a value
+        is not one the operation knows.
+        """
+        intent = self.intents[name]
+        signature = inspect.signature(OPERATIONS[intent["operation"]]["function"]).parameters
+        coerced = {}
+        for param, value in params.items():
+            if value is None or param not in signature:
+                continue
+            value = value.strip()
+            choices = intent.get("choices", {}).get(param)
+            if choices is None and param in KNOWN_VALUES:
+                choices = KNOWN_VALUES[param]()
+            if choices is not None:
+                value = self._canonical(param, value, choices)
+                if value is None:
+                    return None
+            annotation = signature[param].annotation
+            if annotation is int or isinstance(signature[param].default, int):
+                value = int(value)
+            elif annotation is float:
+                value = float(value)
+            coerced[param] = value
+        return coerced
+
+    @staticmethod
+    def _canonical(param: str, value: str, choices) -> str:
+        lowered = value.lower()
+        for choice in choices:
+            if str(choice).lower() == lowered:
+                return str(choice)
+        if param in _SUBSTRING_PARAMS and any(lowered in str(choice).lower() for choice in choices):
+            return value
+        return None
+
+    def _match_rules(self, query: str, department: str):
+        for name, rules in self._rules.items():
+            if department and self.intents[name]["department"] != department:
+                continue
+            for rule in rules:
+                match = rule.match(query)
+                if match:
+                    return name, match.groupdict(), 1.0
+        return None
+
+    def _example_matrix(self):
+        with self._lock:
+            if self._examples is None:
+                names, texts = [], []
+                for name, intent in self.intents.items():
+                    for example in intent.get("examples", []):
+                        names.append(name)
+                        texts.append(example)
+                vectors = np.asarray(self.embedder.embed_documents(texts), dtype="float32") if texts else np.zeros((0, 1), "float32")
+                vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+                self._examples = (names, vectors)
+            return self._examples
+
+    def _match_embedding(self, query: str, department: str, vector=None):
+        names, vectors = self._example_matrix()
+        if vector is None:
+            vector = self.embedder.embed_query(query[:500])
+        vector = np.asarray(vector, dtype="float32")
+        scores = vectors @ (vector / max(float(np.linalg.norm(vector)), 1e-12))
+        best = {}
+        for name, score in zip(names, scores):
+            if (not department or self.intents[name]["department"] == department) and score > best.get(name, -1.0):
+                best[name] = float(score)
+        if not best:
+            return None
+        ranked = sorted(best.items(), key=lambda item: item[1], reverse=True)
+        name, score = ranked[0]
+        runner_up = ranked[1][1] if len(ranked) > 1 else -1.0
+        if score < self.min_similarity or score - runner_up < self.min_margin:
+            return None
+        params, spans = {}, []
+        for param, pattern in self.intents[name].get("params", {}).items():
+            found = re.search(pattern, query, re.IGNORECASE)
+            if found:
+                params[param] = found.group(param)
+                spans.append(found.span())
+        if any(param not in params for param in self.intents[name].get("required", [])):
+            return None
+        if self._carries_filter(name, query, spans):
+            return None
+        return name, params, score
+
+    def _carries_filter(self, name: str, query: str, spans: list) -> bool:
+        """
+        Whether `query`, outside the `spans` already captured as parameters,
+        still holds something that reads as one: a number, a period, a known
+        ERP value or anything the "params" of an intent in the same department
+        capture. Intent `name` would drop that filter and answer for
+        everything, so the query is a miss.
+        """
+        rest = query
+        for start, end in sorted(spans, reverse=True):
+            rest = rest[:start] + " " + rest[end:]
+        if re.search(r"\d", rest) or re.search(rf"\b{_PERIOD}\b", rest, re.IGNORECASE):
+            return True
+        department = self.intents[name]["department"]
+        for intent in self.intents.values():
+            if intent["department"] != department:
+                continue
+            if any(re.search(pattern, rest, re.IGNORECASE) for pattern in intent.get("params", {}).values()):
+                return True
+        lowered = rest.lower()
+        return any(
+            re.search(rf"\b{re.escape(str(value).lower())}\b", lowered)
+            for values in KNOWN_VALUES.values() for value in values()
+        )
+
+    def route(self, query: str, department: str = None, vector=None):
+        """
+        Return {"intent", "operation", "params", "confidence", "method"} for a
+        confident match within `department` (any department if None), else None.
+        `vector` is an optional precomputed embedding of the query.
+        """
+        normalized = self._normalize(query)
+        method = "rule"
+        found = self._match_rules(normalized, department)
+        if found is None and self.embedder is not None:
+            method = "embedding"
+            try:
+                found = self._match_embedding(normalized, department, vector)
+            except Exception as e:
+                logger.error(f"⚠️ Intent embedding match failed: {str(e)}")
+                found = None
+        params = None
+        if found is not None:
+            name, params, confidence = found
+            params = self._coerce(name, params)
+        with self._lock:
+            if params is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            if method == "rule":
+                self.rule_hits += 1
+            else:
+                self.embedding_hits += 1
+            self.intent_hits[name] = self.intent_hits.get(name, 0) + 1
+        return {
+            "intent": name,
+            "operation": self.intents[name]["operation"],
+            "params": params,
+            "confidence": confidence,
+            "method": method,
+        }
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            routed = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / routed if routed else 0.0,
+                "rule_hits": self.rule_hits,
+                "embedding_hits": self.embedding_hits,
+                "intents": dict(self.intent_hits),
+            }
+
+
+
+def get_intent_router(embedder=None, **router_kwargs) -> IntentRouter:
+    """Process-wide IntentRouter per embedding model (rules only if None); kwargs apply on creation only."""
+    key = embedder_name(embedder) if embedder is not None else None
+    with _ROUTERS_LOCK:
+        if key not in _ROUTERS:
+            _ROUTERS[key] = IntentRouter(embedder, **router_kwargs)
+        return _ROUTERS[key]
@@ -0,0 +1,132 @@
+import asyncio
+import os
+import threading
+import weakref
+
+import httpx
+from langchain_openai import ChatOpenAI
+
+TOGETHER_API_BASE = "https://api.together.xyz/v1"
+
+# Named client configurations. "agent" drives the department agents; the
+# smaller "correction" model handles parameter fixes in workflows.self_correction.
+LLM_PROFILES = {
+    "agent": {
+        "model": "meta-llama/Llama-3-70b-chat-hf",
+        "api_key_env": "OPENAI_API_KEY",
+        "temperature": 0.3,
+        "max_tokens": 512,
+    },
+    "correction": {
+        "model": os.getenv("CORRECTION_MODEL", "meta-llama/Llama-3-8b-chat-hf"),
+        "api_key_env": "TOGETHER_API_KEY",
+        "temperature": 0.3,
+        "max_tokens": 256,
+    },
+}
+
+# Every client shares one keep-alive connection pool (one sync, one async);
+# its size caps how many LLM requests are in flight at once (extra requests
+# wait for a connection).
+MAX_CONCURRENT_REQUESTS = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+REQUEST_TIMEOUT = 60.0
+
+_HTTP_CLIENT = None
+_ASYNC_HTTP_CLIENT = None
+_CLIENTS = {}
+_CLIENTS_LOCK = threading.Lock()
+
+
+def _pool_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=MAX_CONCURRENT_REQUESTS,
+        max_keepalive_connections=MAX_CONCURRENT_REQUESTS,
+        keepalive_expiry=120.0,
+    )
+
+
+def _request_timeout() -> httpx.Timeout:
+    # Waiting for a free connection is throttling, not a failure
+    return httpx.Timeout(REQUEST_TIMEOUT, pool=None)
+
+
+class LoopLocalTransport(httpx.AsyncBaseTransport):
+    """
+    Async transport keeping one connection pool per event loop, since pooled
+    connections cannot move between loops. Agent turns normally all run on
+    one loop (the background loop, or the API server's), so that pool's
+    limits are the process's.
+    """
+
+    def __init__(self, **transport_kwargs):
+        self._transport_kwargs = transport_kwargs
+        self._transports = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def _transport(self) -> httpx.AsyncHTTPTransport:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            transport = self._transports.get(loop)
+            if transport is None:
+                transport = httpx.AsyncHTTPTransport(**self._transport_kwargs)
+                self._transports[loop] = transport
+            return transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        return await self._transport().handle_async_request(request)
+
+    async def aclose(self):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            transport = self._transports.pop(loop, None)
+        if transport is not None:
+            await transport.aclose()
+
+
+def get_http_client() -> httpx.Client:
+    """Process-wide pooled HTTP client used by every LLM client."""
+    global _HTTP_CLIENT
+    with _CLIENTS_LOCK:
+        if _HTTP_CLIENT is None:
+            _HTTP_CLIENT = httpx.Client(limits=_pool_limits(), timeout=_request_timeout())
+        return _HTTP_CLIENT
+
+
+def get_async_http_client() -> httpx.AsyncClient:
+    """Async counterpart of get_http_client(), used by ainvoke()/astream()."""
+    global _ASYNC_HTTP_CLIENT
+    with _CLIENTS_LOCK:
+        if _ASYNC_HTTP_CLIENT is None:
+            _ASYNC_HTTP_CLIENT = httpx.AsyncClient(
+                transport=LoopLocalTransport(limits=_pool_limits()),
+                timeout=_request_timeout(),
+            )
+        return _ASYNC_HTTP_CLIENT
+
+
+def get_llm(profile: str = "agent", **overrides) -> ChatOpenAI:
+    """
+    Shared ChatOpenAI for a profile (plus any overrides of its settings), built
+    once per process on the pooled HTTP clients. Use .bind(max_tokens=...) for
+    per-call limits instead of creating new clients.
+    """
+    if profile not in LLM_PROFILES:
+        raise ValueError(f"Unknown LLM profile '{profile}'. Options: {', '.join(LLM_PROFILES)}")
+    settings = {**LLM_PROFILES[profile], **overrides}
+    key = (profile, tuple(sorted(overrides.items())))
+    http_client = get_http_client()
+    http_async_client = get_async_http_client()
+    with _CLIENTS_LOCK:
+        llm = _CLIENTS.get(key)
+        if llm is None:
+            llm = ChatOpenAI(
+                openai_api_key=os.getenv(settings["api_key_env"]),
+                openai_api_base=TOGETHER_API_BASE,
+                model=settings["model"],
+                temperature=settings["temperature"],
+                max_tokens=settings["max_tokens"],
+                http_client=http_client,
+                http_async_client=http_async_client,
+            )
+            _CLIENTS[key] = llm
+        return llm
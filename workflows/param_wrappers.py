@@ -2,6 +2,7 @@ import inspect
 import json
 # workflows/param_wrappers.py
 import re
+from workflows.tracing import span
 
 def tool_with_named_args(func):
     def wrapper(input_str: str):
@@ -21,8 +22,10 @@ def tool_with_named_args(func):
                 params[key] = float(value)
             else:
                 params[key] = value
-        
-        return func(**params)
+
+        with span(f"tool.{func.__name__}", params=sorted(params)):
+            return func(**params)
+    wrapper.mutates = getattr(func, "mutates", False)
     return wrapper
     def wrapper(input_data):
 
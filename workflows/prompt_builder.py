@@ -0,0 +1,131 @@
+import logging
+import re
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Word pieces and single punctuation marks; long words count one token per
+# four characters. Tracks Llama/BPE tokenizers closely enough for budgeting
+# without a model download.
+_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+
+def _token_spans(text: str):
+    """(end offset, tokens) per piece of text, in order."""
+    for match in _TOKEN_PATTERN.finditer(text):
+        piece = match.group(0)
+        yield match.end(), max(1, (len(piece) + 3) // 4)
+
+
+def count_tokens(text: str) -> int:
+    """Local estimate of the number of LLM tokens in text."""
+    return sum(tokens for _, tokens in _token_spans(text))
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    """Longest prefix of text estimated at no more than max_tokens tokens."""
+    used, end = 0, 0
+    for piece_end, tokens in _token_spans(text):
+        if used + tokens > max_tokens:
+            return text[:end].rstrip() + " …"
+        used, end = used + tokens, piece_end
+    return text
+
+
+class PromptBuilder:
+    """
+    Assembles the agent input from retrieved context within a token budget.
+    Entries are ranked by relative distance plus a recency penalty that
+    approaches `recency_weight` as an entry ages past `recency_half_life`
+    seconds. Each entry is capped at `max_entry_tokens`; the best entries are
+    added until `max_context_tokens` is used, the last one trimmed to fit
+    unless fewer than `min_entry_tokens` remain, the rest dropped.
+    """
+
+    def __init__(self, max_context_tokens: int = 600, max_entry_tokens: int = 250,
+                 min_entry_tokens: int = 40, recency_half_life: float = 7 * 24 * 3600,
+                 recency_weight: float = 0.3):
+        self.max_context_tokens = max_context_tokens
+        self.max_entry_tokens = max_entry_tokens
+        self.min_entry_tokens = min_entry_tokens
+        self.recency_half_life = recency_half_life
+        self.recency_weight = recency_weight
+        self._lock = threading.Lock()
+        self.turns = 0
+        self.tokens_used = 0
+        self.tokens_saved = 0
+
+    @staticmethod
+    def format_entry(entry: dict) -> str:
+        return f"Previous Q: {entry['query']}\nPrevious A: {entry['response']}\n\n"
+
+    def rank(self, entries: list, now: float = None) -> list:
+        """Entries best first: closest in embedding space, then most recent."""
+        if not entries:
+            return []
+        now = time.time() if now is None else now
+        max_distance = max(entry.get("distance", 0.0) for entry in entries) or 1.0
+
+        def score(entry):
+            age = max(now - entry.get("timestamp", now), 0.0)
+            staleness = 1.0 - 0.5 ** (age / self.recency_half_life)
+            return entry.get("distance", 0.0) / max_distance + self.recency_weight * staleness
+
+        return sorted(entries, key=score)
+
+    def build_context(self, entries: list):
+        """Context block for the prompt and a report of what the budget kept."""
+        remaining = self.max_context_tokens
+        parts = []
+        trimmed = dropped = 0
+        full_tokens = 0
+        for entry in self.rank(entries):
+            text = self.format_entry(entry)
+            tokens = count_tokens(text)
+            full_tokens += tokens
+            limit = min(remaining, self.max_entry_tokens)
+            if tokens > limit:
+                if limit < self.min_entry_tokens:
+                    dropped += 1
+                    continue
+                # Keep the question whole where possible; the answer is cut first
+                header = f"Previous Q: {entry['query']}\nPrevious A: "
+                answer_budget = limit - count_tokens(header) - 1  # the " …" marker
+                if answer_budget <= 0:
+                    dropped += 1
+                    continue
+                text = f"{header}{truncate_tokens(entry['response'], answer_budget)}\n\n"
+                tokens = count_tokens(text)
+                trimmed += 1
+            parts.append(text)
+            remaining -= tokens
+        context_tokens = self.max_context_tokens - remaining
+        report = {
+            "context_tokens": context_tokens,
+            "tokens_saved": full_tokens - context_tokens,
+            "entries_used": len(parts),
+            "entries_trimmed": trimmed,
+            "entries_dropped": dropped,
+        }
+        return "".join(parts), report
+
+    def build(self, query: str, entries: list):
+        """Agent input for a query with its retrieved context; returns (prompt, report)."""
+        context_str, report = self.build_context(entries)
+        with self._lock:
+            self.turns += 1
+            self.tokens_used += report["context_tokens"]
+            self.tokens_saved += report["tokens_saved"]
+        if report["tokens_saved"]:
+            logger.info(f"Prompt context: {report['context_tokens']} tokens, {report['tokens_saved']} saved")
+        return f"{context_str}Current Question: {query}", report
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {
+                "turns": self.turns,
+                "max_context_tokens": self.max_context_tokens,
+                "avg_context_tokens": self.tokens_used / self.turns if self.turns else 0.0,
+                "tokens_saved": self.tokens_saved,
+            }
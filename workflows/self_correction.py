@@ -1,18 +1,11 @@
 import inspect
 import json
-from langchain_openai import ChatOpenAI
-import os
+from workflows.llm_clients import get_llm
 
 class SelfCorrectionSystem:
     @staticmethod
     def correct(operation_name: str, params: dict, error_message: str) -> dict:
-        llm = ChatOpenAI(
-            openai_api_key=os.getenv("TOGETHER_API_KEY"),
-            openai_api_base="https://api.together.xyz/v1",
-            model="meta-llama/Llama-3-70b-chat-hf",
-            temperature=0.3,
-            max_tokens=256,
-        )
+        llm = get_llm("correction")
         prompt = f"""
 ERP operation '{operation_name}' failed with error: {error_message}
 Parameters used: {params}
@@ -45,13 +38,7 @@ Function '{func.__name__}' requires parameter '{name}' of type {param.annotation
 Generate appropriate value based on context: {params}
 Output only the value, no other text.
 """
-            llm = ChatOpenAI(
-                openai_api_key=os.getenv("TOGETHER_API_KEY"),
-                openai_api_base="https://api.together.xyz/v1",
-                model="meta-llama/Llama-3-70b-chat-hf",
-                temperature=0.3,
-                max_tokens=64,
-            )
+            llm = get_llm("correction").bind(max_tokens=64)
             try:
                 response = llm.invoke(prompt)
                 valid_params[name] = response.content
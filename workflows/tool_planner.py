@@ -0,0 +1,227 @@
+import asyncio
+import contextvars
+import json
+import logging
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from workflows.event_loop import iterate, run_coroutine
+from workflows.tracing import span
+
+logger = logging.getLogger(__name__)
+
+# Tool calls from every agent share one pool; ERP operations are blocking
+MAX_TOOL_WORKERS = int(os.getenv("TOOL_MAX_WORKERS", "8"))
+
+# Characters of a reply held back before streaming it as an answer, so a short
+# preamble ahead of a JSON plan is not shown to the user
+PLAN_LOOKAHEAD = 80
+
+_TOOL_POOL = None
+_TOOL_POOL_LOCK = threading.Lock()
+
+PLAN_PROMPT = """You are the {department} assistant for an ERP system. Tools:
+{tools}
+
+To call tools, reply with only a JSON object listing every call you need
+now; only list calls that do not depend on each other's results:
+{{"tool_calls": [{{"tool": "<tool name>", "input": "name=value, name=value"}}]}}
+When the results below are enough to answer (or no tool is needed), reply
+with just the final answer in markdown, not JSON.
+
+{question}
+{observations}"""
+
+
+def get_tool_pool() -> ThreadPoolExecutor:
+    """Process-wide thread pool for running agent tools concurrently."""
+    global _TOOL_POOL
+    with _TOOL_POOL_LOCK:
+        if _TOOL_POOL is None:
+            _TOOL_POOL = ThreadPoolExecutor(max_workers=MAX_TOOL_WORKERS, thread_name_prefix="agent-tool")
+        return _TOOL_POOL
+
+
+def _parse_reply(text: str):
+    """First JSON object in an LLM reply, or None."""
+    match = re.search(r"\{.*\}", text, re.DOTALL)
+    if not match:
+        return None
+    try:
+        reply = json.loads(match.group(0))
+    except json.JSONDecodeError:
+        return None
+    return reply if isinstance(reply, dict) else None
+
+
+class ParallelToolExecutor:
+    """
+    Agent executor that asks the LLM for all independent tool calls at once,
+    runs the read-only ones concurrently on the tool pool (calls to operations
+    marked @mutates follow one at a time) and feeds the merged observations
+    into the next LLM step, so a compound question costs one planning and one
+    answering call instead of a round-trip per tool. Same ainvoke() contract
+    as the LangChain executor; replies that are not valid plans are handed to
+    `fallback` (e.g. the ReAct executor) if given.
+    """
+
+    def __init__(self, llm, tools, department: str = "", fallback=None, max_rounds: int = 2,
+                 max_calls: int = 6, max_observation_chars: int = 2000):
+        self.llm = llm
+        self.tools = {tool.name: tool for tool in tools}
+        self.department = department
+        self.fallback = fallback
+        self.max_rounds = max_rounds
+        self.max_calls = max_calls
+        self.max_observation_chars = max_observation_chars
+
+    def _prompt(self, question: str, steps: list) -> str:
+        tools = "\n".join(f"- {tool.name}: {tool.description}" for tool in self.tools.values())
+        observations = ""
+        if steps:
+            observations = "Tool results:\n" + "\n\n".join(
+                f"[{call['tool']}({call['input']})]\n{observation}" for call, observation in steps
+            )
+        return PLAN_PROMPT.format(department=self.department, tools=tools,
+                                  question=question, observations=observations)
+
+    def _run_tool(self, call: dict) -> str:
+        tool = self.tools.get(call.get("tool"))
+        if tool is None:
+            return f"❌ Unknown tool '{call.get('tool')}'. Options: {', '.join(self.tools)}"
+        try:
+            observation = str(tool.run(str(call.get("input", ""))))
+        except Exception as e:
+            observation = f"❌ Tool failed: {str(e)}"
+        return observation[:self.max_observation_chars]
+
+    def _mutates(self, call: dict) -> bool:
+        tool = self.tools.get(call.get("tool"))
+        return tool is not None and getattr(tool.func, "mutates", False)
+
+    async def _iter_calls(self, calls: list):
+        """
+        (call, observation) pairs: read-only calls concurrently, in completion
+        order, then calls that change ERP data one at a time in plan order.
+        """
+        loop = asyncio.get_running_loop()
+        pool = get_tool_pool()
+
+        async def run(call):
+            # Each call gets a copy of the context so its spans nest under this turn
+            observation = await loop.run_in_executor(pool, contextvars.copy_context().run, self._run_tool, call)
+            return call, observation
+
+        reads = [call for call in calls if not self._mutates(call)]
+        writes = [call for call in calls if self._mutates(call)]
+        for finished in asyncio.as_completed([run(call) for call in reads]):
+            yield await finished
+        for call in writes:
+            yield await run(call)
+
+    async def aiter_events(self, input: dict):
+        """
+        Run a turn as a stream of events: {"type": "token", "text"} while the
+        final answer is generated, {"type": "tool_start", "tool", "input"} and
+        {"type": "tool_end", "tool", "observation"} around each tool call, and
+        finally {"type": "output", "output", "intermediate_steps"}. Replies are
+        streamed once past PLAN_LOOKAHEAD characters without a "{" or "`", and
+        buffered otherwise; a complete reply that still turns out to be a plan
+        is preceded by {"type": "reset"}: drop the token text seen so far.
+        """
+        question = input["input"]
+        steps = []
+        for round_number in range(self.max_rounds + 1):
+            prompt = self._prompt(question, steps)
+            if round_number == self.max_rounds:
+                prompt += "\nNo more tool calls are allowed; answer now."
+            text = ""
+            sent = 0
+            held = False
+            with span("llm.plan", round=round_number):
+                async for chunk in self.llm.astream(prompt):
+                    text += chunk.content
+                    if held:
+                        continue
+                    body = text.lstrip()
+                    if "{" in body or "`" in body:
+                        # Possibly a plan; decided once the reply is complete
+                        held = True
+                    elif sent or len(body) >= PLAN_LOOKAHEAD:
+                        yield {"type": "token", "text": body[sent:]}
+                        sent = len(body)
+            reply = text.strip()
+            plan = _parse_reply(reply) if held else None
+            if plan is None or ("tool_calls" not in plan and "answer" not in plan):
+                if reply.startswith(("{", "`")) and self.fallback is not None and not steps:
+                    logger.info("Unparseable tool plan; using fallback executor")
+                    async for event in executor_events(self.fallback, input):
+                        yield event
+                    return
+                if reply[sent:]:
+                    yield {"type": "token", "text": reply[sent:]}
+                yield {"type": "output", "output": reply, "intermediate_steps": steps}
+                return
+            if sent:
+                yield {"type": "reset"}
+            if plan.get("answer") is not None:
+                answer = str(plan["answer"]).strip()
+                yield {"type": "token", "text": answer}
+                yield {"type": "output", "output": answer, "intermediate_steps": steps}
+                return
+            calls = [call for call in plan.get("tool_calls") or [] if isinstance(call, dict)]
+            if not calls or round_number == self.max_rounds:
+                # No answer given: the raw tool results are the best we have
+                output = "\n\n".join(observation for _, observation in steps) or reply
+                yield {"type": "output", "output": output, "intermediate_steps": steps}
+                return
+            calls = calls[:self.max_calls]
+            logger.info(f"Running {len(calls)} tool call(s), read-only ones in parallel: "
+                        f"{[call.get('tool') for call in calls]}")
+            for call in calls:
+                yield {"type": "tool_start", "tool": call.get("tool"), "input": call.get("input", "")}
+            with span("tools.parallel", calls=len(calls)):
+                async for call, observation in self._iter_calls(calls):
+                    steps.append((call, observation))
+                    yield {"type": "tool_end", "tool": call.get("tool"), "observation": observation}
+
+    async def ainvoke(self, input: dict) -> dict:
+        result = {"output": "", "intermediate_steps": []}
+        async for event in self.aiter_events(input):
+            if event["type"] == "output":
+                result = {"output": event["output"], "intermediate_steps": event["intermediate_steps"]}
+        return result
+
+    def invoke(self, input: dict) -> dict:
+        return run_coroutine(self.ainvoke(input))
+
+    def stream(self, input: dict):
+        """Chunks in the LangChain executor's shape: one per observation, then the output."""
+        for event in iterate(self.aiter_events(input)):
+            if event["type"] == "tool_end":
+                yield {"observation": event["observation"]}
+            elif event["type"] == "output":
+                yield {"output": event["output"]}
+
+
+async def executor_events(executor, input: dict):
+    """
+    Events (as from ParallelToolExecutor.aiter_events) for any agent executor.
+    LangChain executors report tool calls and the output but no tokens: their
+    LLM output is the agent's own action syntax, not the answer.
+    """
+    if hasattr(executor, "aiter_events"):
+        async for event in executor.aiter_events(input):
+            yield event
+        return
+    steps = []
+    async for chunk in executor.astream(input):
+        for action in chunk.get("actions", []):
+            yield {"type": "tool_start", "tool": action.tool, "input": action.tool_input}
+        for step in chunk.get("steps", []):
+            steps.append((step.action, step.observation))
+            yield {"type": "tool_end", "tool": step.action.tool, "observation": str(step.observation)}
+        if "output" in chunk:
+            yield {"type": "output", "output": chunk["output"], "intermediate_steps": steps}
@@ -0,0 +1,185 @@
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Spans record two clock reads and a small object each; TRACING=0 turns
+# even that off. Span attributes should stay small (ids, counts, names).
+TRACING_ENABLED = os.getenv("TRACING", "1") != "0"
+
+_CURRENT_SPAN = contextvars.ContextVar("current_span", default=None)
+_SINKS = []
+_SINKS_LOCK = threading.Lock()
+
+
+class Span:
+    __slots__ = ("name", "attrs", "start", "end", "children", "error", "trace")
+
+    def __init__(self, name: str, attrs: dict, trace):
+        self.name = name
+        self.attrs = attrs
+        self.start = time.perf_counter()
+        self.end = None
+        self.children = []
+        self.error = None
+        self.trace = trace
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+
+class RingBufferSink:
+    """Keeps the last `maxlen` finished traces in memory (the Streamlit panel reads these)."""
+
+    def __init__(self, maxlen: int = 50):
+        self._traces = deque(maxlen=maxlen)
+        self._lock = threading.Lock()
+
+    def emit(self, trace: dict):
+        with self._lock:
+            self._traces.append(trace)
+
+    def traces(self, limit: int = None) -> list:
+        """Most recent first."""
+        with self._lock:
+            traces = list(self._traces)[::-1]
+        return traces[:limit] if limit else traces
+
+
+class JsonlSink:
+    """Appends each finished trace as one JSON line."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def emit(self, trace: dict):
+        line = json.dumps(trace, default=str)
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+
+_RING_BUFFER = RingBufferSink()
+
+
+def get_ring_buffer() -> RingBufferSink:
+    """Process-wide in-memory sink, registered by default."""
+    return _RING_BUFFER
+
+
+def add_sink(sink):
+    """Register an object with emit(trace: dict); it is called once per finished request."""
+    with _SINKS_LOCK:
+        _SINKS.append(sink)
+
+
+def remove_sink(sink):
+    with _SINKS_LOCK:
+        if sink in _SINKS:
+            _SINKS.remove(sink)
+
+
+add_sink(_RING_BUFFER)
+if os.getenv("TRACE_FILE"):
+    add_sink(JsonlSink(os.getenv("TRACE_FILE")))
+
+
+def _flatten(span: Span, origin: float, depth: int, out: list):
+    end = span.end if span.end is not None else time.perf_counter()
+    record = {
+        "name": span.name,
+        "depth": depth,
+        "offset_ms": round((span.start - origin) * 1000, 3),
+        "duration_ms": round((end - span.start) * 1000, 3),
+    }
+    if span.attrs:
+        record["attrs"] = span.attrs
+    if span.error:
+        record["error"] = span.error
+    out.append(record)
+    for child in list(span.children):
+        _flatten(child, origin, depth + 1, out)
+
+
+def _emit(root: Span, request_id: str, started_at: float):
+    spans = []
+    _flatten(root, root.start, 0, spans)
+    trace = {
+        "request_id": request_id,
+        "name": root.name,
+        "started_at": started_at,
+        "duration_ms": spans[0]["duration_ms"],
+        "spans": spans,
+    }
+    with _SINKS_LOCK:
+        sinks = list(_SINKS)
+    for sink in sinks:
+        try:
+            sink.emit(trace)
+        except Exception as e:
+            logger.error(f"⚠️ Trace sink failed: {str(e)}")
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """
+    Time a stage of the current request as a child of the active span. Does
+    nothing (and yields None) outside a trace, so library code can be
+    instrumented unconditionally.
+    """
+    parent = _CURRENT_SPAN.get()
+    if parent is None or not TRACING_ENABLED:
+        yield None
+        return
+    current = Span(name, attrs, parent.trace)
+    parent.children.append(current)
+    token = _CURRENT_SPAN.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        current.end = time.perf_counter()
+        _CURRENT_SPAN.reset(token)
+
+
+@contextmanager
+def trace(name: str, request_id: str = None, **attrs):
+    """
+    Root span for one request; sent to every sink when it ends. Inside an
+    active trace this is an ordinary span, so entry points can nest.
+    """
+    if _CURRENT_SPAN.get() is not None or not TRACING_ENABLED:
+        with span(name, **attrs) as current:
+            yield current
+        return
+    request_id = request_id or uuid.uuid4().hex[:12]
+    started_at = time.time()
+    root = Span(name, attrs, request_id)
+    token = _CURRENT_SPAN.set(root)
+    try:
+        yield root
+    except BaseException as e:
+        root.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        root.end = time.perf_counter()
+        _CURRENT_SPAN.reset(token)
+        _emit(root, request_id, started_at)
+
+
+def current_request_id():
+    current = _CURRENT_SPAN.get()
+    return current.trace if current is not None else None
@@ -1,6 +1,8 @@
 from workflows.self_correction import correct_parameters
 from mock_erp.operations import OPERATIONS
 from workflows.self_correction import SelfCorrectionSystem
+from workflows.intent_router import get_intent_router
+from workflows.tracing import span
 
 def execute_workflow(operation_name: str, params: dict) -> str:
     """
@@ -23,10 +25,12 @@ def execute_workflow(operation_name: str, params: dict) -> str:
         corrected_params = correct_parameters(operation["function"], params)
         
         # Execute operation with corrected parameters
-        result = operation["function"](**corrected_params)
-        
+        with span(f"operation.{operation_name}"):
+            result = operation["function"](**corrected_params)
+
         # Format and return output
-        return operation["output_formatter"](result)
+        with span("operation.format"):
+            return operation["output_formatter"](result)
     
     except Exception as e:
         # Attempt self-correction of parameters
@@ -34,3 +38,27 @@ def execute_workflow(operation_name: str, params: dict) -> str:
         if correction:
             return execute_workflow(operation_name, correction)
         return f"❌ Operation failed: {str(e)}"
+
+
+def execute_query(query: str, department: str = None, router=None, vector=None):
+    """
+    Answer a natural-language query through the intent fast path.
+
+    Args:
+        query (str): The user's query.
+        department (str): Only route to this department's intents (any if None).
+        router (IntentRouter): Router to use; defaults to the shared rules-only router.
+        vector: Optional precomputed embedding of the query.
+
+    Returns:
+        str: The formatted operation result, or None if no intent matched confidently
+        and the query should go to an agent.
+    """
+    router = router or get_intent_router()
+    with span("intent_router.route") as current:
+        match = router.route(query, department, vector=vector)
+        if current is not None:
+            current.set(intent=match["intent"] if match else None)
+    if match is None:
+        return None
+    return execute_workflow(match["operation"], match["params"])